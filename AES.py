@@ -1,5 +1,10 @@
+import functools
+import mmap
 import os
-from typing import List, Union
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple, Union
 
 # Define the AES S-Box
 S_BOX = [
@@ -29,7 +34,7 @@ INV_S_BOX = [
     [0x08, 0x2E, 0xA1, 0x66, 0x28, 0xD9, 0x24, 0xB2, 0x76, 0x5B, 0xA2, 0x49, 0x6D, 0x8B, 0xD1, 0x25],
     [0x72, 0xF8, 0xF6, 0x64, 0x86, 0x68, 0x98, 0x16, 0xD4, 0xA4, 0x5C, 0xCC, 0x5D, 0x65, 0xB6, 0x92],
     [0x6C, 0x70, 0x48, 0x50, 0xFD, 0xED, 0xB9, 0xDA, 0x5E, 0x15, 0x46, 0x57, 0xA7, 0x8D, 0x9D, 0x84],
-    [0x90, 0xD8, 0xAB, 0x00, 0x8C, 0xBC, 0xD3, 0x0A, 0xF7, 0xE4, 0x58, 0x05, 0xB8, 0x3A, 0x45, 0x06],
+    [0x90, 0xD8, 0xAB, 0x00, 0x8C, 0xBC, 0xD3, 0x0A, 0xF7, 0xE4, 0x58, 0x05, 0xB8, 0xB3, 0x45, 0x06],
     [0xD0, 0x2C, 0x1E, 0x8F, 0xCA, 0x3F, 0x0F, 0x02, 0xC1, 0xAF, 0xBD, 0x03, 0x01, 0x13, 0x8A, 0x6B],
     [0x3A, 0x91, 0x11, 0x41, 0x4F, 0x67, 0xDC, 0xEA, 0x97, 0xF2, 0xCF, 0xCE, 0xF0, 0xB4, 0xE6, 0x73],
     [0x96, 0xAC, 0x74, 0x22, 0xE7, 0xAD, 0x35, 0x85, 0xE2, 0xF9, 0x37, 0xE8, 0x1C, 0x75, 0xDF, 0x6E],
@@ -45,24 +50,122 @@ RCON = [
     0x01, 0x02, 0x04, 0x08, 0x10, 0x20, 0x40, 0x80, 0x1B, 0x36
 ]
 
+ENGINES = ("reference", "ttable", "compact")
+
+STREAM_MODES = ("ecb", "cbc", "ctr")
+
+# Bytes read from a file object per step by encrypt_stream/decrypt_stream
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Bytes transformed per step by encrypt_into/decrypt_into, bounding the temporary keystream/output size
+INTO_SPAN_SIZE = 64 * 1024
+
+# Smallest segment handed to a worker process; below this, pickling the data costs more than encrypting it
+MIN_PARALLEL_SEGMENT = 64 * 1024
+
+
+def _xtime(a: int) -> int:
+    """Multiply a byte by x (0x02) in GF(2^8)."""
+    a <<= 1
+    return (a ^ 0x11B) if a & 0x100 else a
+
+
+def _ror8(word: int) -> int:
+    """Rotate a 32-bit word right by one byte."""
+    return ((word >> 8) | (word << 24)) & 0xFFFFFFFF
+
+
+# Flat 256-entry S-Boxes, indexed directly by the byte value
+S_BOX_FLAT = [byte for row in S_BOX for byte in row]
+INV_S_BOX_FLAT = [byte for row in INV_S_BOX for byte in row]
+
+# Combined SubBytes + ShiftRows + MixColumns tables on 32-bit column words.
+# TE0[x] is the column (2*S[x], S[x], S[x], 3*S[x]); TE1..TE3 are byte rotations of it.
+TE0 = []
+for _s in S_BOX_FLAT:
+    _s2 = _xtime(_s)
+    TE0.append((_s2 << 24) | (_s << 16) | (_s << 8) | (_s2 ^ _s))
+TE1 = [_ror8(w) for w in TE0]
+TE2 = [_ror8(w) for w in TE1]
+TE3 = [_ror8(w) for w in TE2]
+
+# Inverse tables for the equivalent inverse cipher (FIPS-197 5.3.5): InvSubBytes + InvShiftRows + InvMixColumns.
+# TD0[x] is the column (14*Si[x], 9*Si[x], 13*Si[x], 11*Si[x]); TD1..TD3 are byte rotations of it.
+TD0 = []
+for _s in INV_S_BOX_FLAT:
+    _s2 = _xtime(_s)
+    _s4 = _xtime(_s2)
+    _s8 = _xtime(_s4)
+    TD0.append(((_s8 ^ _s4 ^ _s2) << 24) | ((_s8 ^ _s) << 16) | ((_s8 ^ _s4 ^ _s) << 8) | (_s8 ^ _s2 ^ _s))
+TD1 = [_ror8(w) for w in TD0]
+TD2 = [_ror8(w) for w in TD1]
+TD3 = [_ror8(w) for w in TD2]
+
+# Byte-level tables for the compact engine, which keeps the state in a preallocated 16-byte bytearray.
+# State bytes, table entries and round-key bytes are all below 256, so the lookups and XORs on them only produce
+# CPython's cached small ints. Buffer offsets (src_offset + i, k + c) grow past 256 and are still allocated.
+MUL2 = tuple(_xtime(x) for x in range(256))
+MUL9 = tuple(_xtime(_xtime(_xtime(x))) ^ x for x in range(256))
+MUL11 = tuple(_xtime(_xtime(_xtime(x)) ^ x) ^ x for x in range(256))
+MUL13 = tuple(_xtime(_xtime(_xtime(x) ^ x)) ^ x for x in range(256))
+MUL14 = tuple(_xtime(_xtime(_xtime(x) ^ x) ^ x) for x in range(256))
+S_BOX_TUPLE = tuple(S_BOX_FLAT)
+INV_S_BOX_TUPLE = tuple(INV_S_BOX_FLAT)
+# ShiftRows as an index permutation of the column-major state: output byte 4c + r comes from column (c + r) % 4
+SHIFT_ROWS_INDEX = tuple(4 * ((c + r) % 4) + r for c in range(4) for r in range(4))
+INV_SHIFT_ROWS_INDEX = tuple(4 * ((c - r) % 4) + r for c in range(4) for r in range(4))
+
 
 def hex_matrix(matrix):
     """Convert a 4x4 matrix to hexadecimal string representation."""
     return [[f"{byte:02x}" for byte in row] for row in matrix]
 
 
+def _timed(phase: str):
+    """Time a method under the given phase name when the instance has metrics installed."""
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.metrics is None:
+                return method(self, *args, **kwargs)
+            with self.metrics.phase(phase):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
 class AES:
-    def __init__(self, key_size: int = 128):
-        """Initialize AES with key size (128, 192, or 256 bits)."""
+    def __init__(self, key_size: int = 128, engine: str = "reference", cache_size: int = 0):
+        """Initialize AES with key size (128, 192, or 256 bits) and round engine.
+
+        engine="reference" runs SubBytes/ShiftRows/MixColumns step by step on a 4x4 state,
+        engine="ttable" runs the rounds on four 32-bit column words with precomputed T-tables, and decrypts
+        with the equivalent inverse cipher and inverse T-tables.
+        engine="compact" works in two preallocated 16-byte bytearrays and writes straight into an output
+        buffer, allocating no bytes objects per block on the buffer paths (encrypt_into/decrypt_into in ECB mode).
+        cache_size > 0 keeps the expanded schedules of that many recently used keys.
+        """
         if key_size not in (128, 192, 256):
             raise ValueError("Key size must be 128, 192, or 256 bits")
+        if engine not in ENGINES:
+            raise ValueError(f"Engine must be one of {', '.join(ENGINES)}")
         self.key_size = key_size
+        self.engine = engine
         self.rounds = {128: 10, 192: 12, 256: 14}[key_size]
         self.S_BOX = S_BOX
         self.INV_S_BOX = INV_S_BOX
         self.RCON = RCON
+        self.schedule_cache = KeyScheduleCache(cache_size) if cache_size > 0 else None
+        self.on_round = None
+        self.metrics = None
         self.debug = False  # Add debug flag
 
+    @classmethod
+    def new(cls, key: Union[bytes, str], engine: str = "reference", cache_size: int = 0) -> "AESContext":
+        """Create a cipher bound to key; the key size is taken from the key length."""
+        key = cls._coerce_key(key)
+        return AESContext(cls(len(key) * 8, engine, cache_size), key)
+
     def set_debug(self, debug: bool):
         """Enable or disable debug output."""
         self.debug = debug
@@ -72,66 +175,366 @@ class AES:
         if self.debug:
             print(*args, **kwargs)
 
-    def encrypt(self, plaintext: Union[bytes, str], key: Union[bytes, str]) -> bytes:
-        # Ensure plaintext is bytes
-        if isinstance(plaintext, str):
-            plaintext = plaintext.encode('utf-8')
+    def set_instrumentation(self, on_round: Optional[Callable[[str, int, List[List[int]]], None]] = None,
+                            metrics=None) -> None:
+        """Install a per-step round callback and/or a metrics collector; call with no arguments to remove them.
+
+        on_round(step, round, state) is called after every step of every round, on the reference engine's
+        state. metrics is an Instrumentation.CipherMetrics (or anything with count() and phase()).
+        Without either, the uninstrumented block functions are used.
+        """
+        self.on_round = on_round
+        self.metrics = metrics
+        if on_round is None and metrics is None:
+            self.__dict__.pop('_encrypt_scheduled', None)
+            self.__dict__.pop('_decrypt_scheduled', None)
+        else:
+            # Instance attributes shadow the plain block functions only while instrumentation is on
+            self._encrypt_scheduled = self._encrypt_scheduled_instrumented
+            self._decrypt_scheduled = self._decrypt_scheduled_instrumented
+
+    def _new_schedule(self, key: bytes) -> "KeySchedule":
+        """Expand key, counting and timing the expansion when metrics are installed."""
+        if self.metrics is None:
+            return KeySchedule(self, key)
+        self.metrics.count("key_expansions")
+        with self.metrics.phase("key_expansion"):
+            return KeySchedule(self, key)
 
-        # Ensure key is in correct bytes format
+    @staticmethod
+    def _coerce_key(key: Union[bytes, str]) -> bytes:
+        """Convert a hex or text key to bytes."""
         if isinstance(key, str):
             key = bytes.fromhex(key) if all(c in '0123456789abcdefABCDEF' for c in key) else key.encode('utf-8')
+        return key
+
+    def expand(self, key: Union[bytes, str]) -> "KeySchedule":
+        """Return the encryption and decryption schedules for key, from the cache when enabled."""
+        key = self._coerce_key(key)
 
         # Validate key length
         if len(key) * 8 != self.key_size:
             raise ValueError(f"Key must be {self.key_size} bits")
 
+        if self.schedule_cache is not None:
+            return self.schedule_cache.get(self, key)
+        return self._new_schedule(key)
+
+    def encrypt(self, plaintext: Union[bytes, str], key: Union[bytes, str]) -> bytes:
+        return self._encrypt_with_schedule(plaintext, self.expand(key))
+
+    def decrypt(self, ciphertext: bytes, key: Union[bytes, str]) -> bytes:
+        return self._decrypt_with_schedule(ciphertext, self.expand(key))
+
+    @_timed("encrypt")
+    def _encrypt_with_schedule(self, plaintext: Union[bytes, str], schedule: "KeySchedule") -> bytes:
+        # Ensure plaintext is bytes
+        if isinstance(plaintext, str):
+            plaintext = plaintext.encode('utf-8')
+
         # Pad the plaintext
         padded_text = self._pad_pkcs7(plaintext)
         self._debug_print(f"Padded text (hex): {padded_text.hex()}")
 
         # Encrypt each block
-        blocks = [padded_text[i:i + 16] for i in range(0, len(padded_text), 16)]
-        ciphertext = b''
-        for block in blocks:
-            encrypted_block = self._encrypt_block(block, key)
+        ciphertext = []
+        for i in range(0, len(padded_text), 16):
+            encrypted_block = self._encrypt_scheduled(padded_text[i:i + 16], schedule)
             self._debug_print(f"Encrypted block (hex): {encrypted_block.hex()}")
-            ciphertext += encrypted_block
+            ciphertext.append(encrypted_block)
 
-        return ciphertext
-
-    def decrypt(self, ciphertext: bytes, key: Union[bytes, str]) -> bytes:
-        # Convert key to bytes if necessary
-        if isinstance(key, str):
-            key = bytes.fromhex(key) if all(c in '0123456789abcdefABCDEF' for c in key) else key.encode('utf-8')
+        return b''.join(ciphertext)
 
+    @_timed("decrypt")
+    def _decrypt_with_schedule(self, ciphertext: bytes, schedule: "KeySchedule") -> bytes:
         # Validate ciphertext length
         if len(ciphertext) % 16 != 0:
             raise ValueError("Ciphertext length must be a multiple of 16 bytes")
 
         # Decrypt each block and assemble plaintext
-        blocks = [ciphertext[i:i + 16] for i in range(0, len(ciphertext), 16)]
-        plaintext = b''
-
-        for block in blocks:
-            decrypted_block = self._decrypt_block(block, key)
+        plaintext = []
+        for i in range(0, len(ciphertext), 16):
+            decrypted_block = self._decrypt_scheduled(ciphertext[i:i + 16], schedule)
             self._debug_print(f"Decrypted block (hex): {decrypted_block.hex()}")
-            plaintext += decrypted_block
+            plaintext.append(decrypted_block)
 
         # Unpad and return plaintext
         try:
-            unpadded_plaintext = self._unpad_pkcs7(plaintext)
+            unpadded_plaintext = self._unpad_pkcs7(b''.join(plaintext))
             self._debug_print(f"Unpadded plaintext (hex): {unpadded_plaintext.hex()}")
             return unpadded_plaintext
         except ValueError as e:
             self._debug_print(f"Padding error: {str(e)}")
             raise
 
+    # Block cipher modes. CTR and CBC decryption work on independent segments and can use a process pool.
+
+    def encrypt_ctr(self, data: Union[bytes, str], key: Union[bytes, str], nonce: bytes,
+                    workers: Optional[int] = 1) -> bytes:
+        """Encrypt data in CTR mode (no padding). The 16-byte nonce is the first counter block."""
+        return self._ctr_with_schedule(data, self.expand(key), nonce, workers)
+
+    def decrypt_ctr(self, data: bytes, key: Union[bytes, str], nonce: bytes,
+                    workers: Optional[int] = 1) -> bytes:
+        """Decrypt CTR data; identical to encryption."""
+        return self._ctr_with_schedule(data, self.expand(key), nonce, workers)
+
+    def encrypt_cbc(self, plaintext: Union[bytes, str], key: Union[bytes, str], iv: bytes) -> bytes:
+        """PKCS#7-pad and encrypt in CBC mode. Chaining makes this inherently serial."""
+        return self._cbc_encrypt_with_schedule(plaintext, self.expand(key), iv)
+
+    def decrypt_cbc(self, ciphertext: bytes, key: Union[bytes, str], iv: bytes,
+                    workers: Optional[int] = 1) -> bytes:
+        """Decrypt CBC ciphertext and remove the PKCS#7 padding."""
+        return self._cbc_decrypt_with_schedule(ciphertext, self.expand(key), iv, workers)
+
+    @_timed("ctr")
+    def _ctr_with_schedule(self, data: Union[bytes, str], schedule: "KeySchedule", nonce: bytes,
+                           workers: Optional[int]) -> bytes:
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        if len(nonce) != 16:
+            raise ValueError("Nonce must be 16 bytes")
+        counter = int.from_bytes(nonce, 'big')
+        size = _segment_size(len(data), _resolve_workers(workers))
+        tasks = [(data[i:i + size], counter + i // 16) for i in range(0, len(data), size)]
+        return self._run_segments("_ctr_segment", schedule, tasks, workers)
+
+    @_timed("cbc_encrypt")
+    def _cbc_encrypt_with_schedule(self, plaintext: Union[bytes, str], schedule: "KeySchedule",
+                                   iv: bytes) -> bytes:
+        if isinstance(plaintext, str):
+            plaintext = plaintext.encode('utf-8')
+        if len(iv) != 16:
+            raise ValueError("IV must be 16 bytes")
+        return self._cbc_encrypt_blocks(schedule, self._pad_pkcs7(plaintext), iv)
+
+    @_timed("cbc_decrypt")
+    def _cbc_decrypt_with_schedule(self, ciphertext: bytes, schedule: "KeySchedule", iv: bytes,
+                                   workers: Optional[int]) -> bytes:
+        if len(ciphertext) % 16 != 0:
+            raise ValueError("Ciphertext length must be a multiple of 16 bytes")
+        if len(iv) != 16:
+            raise ValueError("IV must be 16 bytes")
+        size = _segment_size(len(ciphertext), _resolve_workers(workers))
+        # Each segment only needs the ciphertext block that precedes it
+        tasks = [(ciphertext[i:i + size], ciphertext[i - 16:i] if i else iv)
+                 for i in range(0, len(ciphertext), size)]
+        return self._unpad_pkcs7(self._run_segments("_cbc_decrypt_segment", schedule, tasks, workers))
+
+    def _ecb_encrypt_blocks(self, schedule: "KeySchedule", data: bytes) -> bytes:
+        """Encrypt whole blocks independently."""
+        return b''.join(self._encrypt_scheduled(data[i:i + 16], schedule) for i in range(0, len(data), 16))
+
+    def _ecb_decrypt_blocks(self, schedule: "KeySchedule", data: bytes) -> bytes:
+        """Decrypt whole blocks independently."""
+        return b''.join(self._decrypt_scheduled(data[i:i + 16], schedule) for i in range(0, len(data), 16))
+
+    def _cbc_encrypt_blocks(self, schedule: "KeySchedule", data: bytes, previous: bytes) -> bytes:
+        """Encrypt whole blocks in CBC mode, chaining from previous (the IV or last ciphertext block)."""
+        previous = int.from_bytes(previous, 'big')
+        ciphertext = []
+        for i in range(0, len(data), 16):
+            block = (int.from_bytes(data[i:i + 16], 'big') ^ previous).to_bytes(16, 'big')
+            encrypted_block = self._encrypt_scheduled(block, schedule)
+            previous = int.from_bytes(encrypted_block, 'big')
+            ciphertext.append(encrypted_block)
+        return b''.join(ciphertext)
+
+    def _ctr_segment(self, schedule: "KeySchedule", data: bytes, counter: int) -> bytes:
+        """XOR data with the keystream of the counter blocks starting at counter."""
+        keystream = b''.join(self._encrypt_scheduled(((counter + i) & _BLOCK_MASK).to_bytes(16, 'big'), schedule)
+                             for i in range((len(data) + 15) // 16))
+        return (int.from_bytes(data, 'big')
+                ^ int.from_bytes(keystream[:len(data)], 'big')).to_bytes(len(data), 'big')
+
+    def _cbc_decrypt_segment(self, schedule: "KeySchedule", data: bytes, previous: bytes) -> bytes:
+        """Decrypt a run of CBC blocks given the ciphertext block before it (or the IV)."""
+        plaintext = []
+        for i in range(0, len(data), 16):
+            block = data[i:i + 16]
+            decrypted = int.from_bytes(self._decrypt_scheduled(block, schedule), 'big')
+            plaintext.append((decrypted ^ int.from_bytes(previous, 'big')).to_bytes(16, 'big'))
+            previous = block
+        return b''.join(plaintext)
+
+    def _run_segments(self, method: str, schedule: "KeySchedule", tasks: List[Tuple],
+                      workers: Optional[int]) -> bytes:
+        """Run a segment method over tasks in order, in this process or across a process pool."""
+        workers = min(_resolve_workers(workers), len(tasks))
+        if workers <= 1:
+            segment = getattr(self, method)
+            return b''.join(segment(schedule, *task) for task in tasks)
+        # The schedule is shipped once per worker through the initializer, not with every task
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_segment_worker,
+                                 initargs=(self.key_size, self.engine, schedule)) as pool:
+            return b''.join(pool.map(_run_segment_task, [(method,) + task for task in tasks]))
+
+    # Streaming over file objects: fixed-size chunks, mode state carried between them
+
+    def encrypt_stream(self, src: BinaryIO, dst: BinaryIO, key: Union[bytes, str],
+                       chunk_size: int = STREAM_CHUNK_SIZE, mode: str = "ecb", iv: Optional[bytes] = None) -> int:
+        """Encrypt src into dst chunk by chunk and return the number of bytes written.
+
+        mode is "ecb", "cbc" or "ctr"; iv is the IV (CBC) or nonce (CTR). ECB and CBC are padded at EOF.
+        """
+        return self._stream(src, dst, self.expand(key), chunk_size, mode, iv, encrypt=True)
+
+    def decrypt_stream(self, src: BinaryIO, dst: BinaryIO, key: Union[bytes, str],
+                       chunk_size: int = STREAM_CHUNK_SIZE, mode: str = "ecb", iv: Optional[bytes] = None) -> int:
+        """Decrypt src into dst chunk by chunk and return the number of bytes written."""
+        return self._stream(src, dst, self.expand(key), chunk_size, mode, iv, encrypt=False)
+
+    @_timed("stream")
+    def _stream(self, src: BinaryIO, dst: BinaryIO, schedule: "KeySchedule", chunk_size: int, mode: str,
+                iv: Optional[bytes], encrypt: bool) -> int:
+        if mode not in STREAM_MODES:
+            raise ValueError(f"Mode must be one of {', '.join(STREAM_MODES)}")
+        if mode != "ecb" and (iv is None or len(iv) != 16):
+            raise ValueError("IV must be 16 bytes")
+        chunk_size = max(16, chunk_size - chunk_size % 16)
+        counter = int.from_bytes(iv, 'big') if mode == "ctr" else 0
+        previous = iv
+        # Decryption with padding holds back the final block until EOF so it can be unpadded
+        hold_back = not encrypt and mode != "ctr"
+        pending = b''
+        written = 0
+
+        while True:
+            chunk = src.read(chunk_size)
+            if not chunk:
+                break
+            data = pending + chunk if pending else chunk
+            if hold_back:
+                ready = (len(data) - 1) // 16 * 16
+            else:
+                ready = len(data) - len(data) % 16
+            pending = data[ready:]
+            if not ready:
+                continue
+            blocks = data[:ready]
+
+            if mode == "ctr":
+                out = self._ctr_segment(schedule, blocks, counter)
+                counter += ready // 16
+            elif mode == "cbc":
+                if encrypt:
+                    out = self._cbc_encrypt_blocks(schedule, blocks, previous)
+                    previous = out[-16:]
+                else:
+                    out = self._cbc_decrypt_segment(schedule, blocks, previous)
+                    previous = blocks[-16:]
+            elif encrypt:
+                out = self._ecb_encrypt_blocks(schedule, blocks)
+            else:
+                out = self._ecb_decrypt_blocks(schedule, blocks)
+            dst.write(out)
+            written += len(out)
+
+        # EOF: the partial CTR block, the padded final block, or the held-back block to unpad
+        if mode == "ctr":
+            out = self._ctr_segment(schedule, pending, counter)
+        elif encrypt:
+            padded = self._pad_pkcs7(pending)
+            out = self._cbc_encrypt_blocks(schedule, padded, previous) if mode == "cbc" \
+                else self._ecb_encrypt_blocks(schedule, padded)
+        else:
+            if len(pending) != 16:
+                raise ValueError("Ciphertext length must be a multiple of 16 bytes")
+            out = self._cbc_decrypt_segment(schedule, pending, previous) if mode == "cbc" \
+                else self._ecb_decrypt_blocks(schedule, pending)
+            out = self._unpad_pkcs7(out)
+        dst.write(out)
+        return written + len(out)
+
+    # Buffer transforms: any writable buffer (bytearray, mmap, memoryview), in place or into a caller's buffer
+
+    def encrypt_into(self, src, key: Union[bytes, str], dst=None, mode: str = "ctr",
+                     iv: Optional[bytes] = None) -> int:
+        """Encrypt src into dst (in place when dst is None) and return the number of bytes processed.
+
+        No padding is applied: ECB and CBC need a multiple of 16 bytes, CTR takes any length.
+        """
+        return self._transform_into(src, dst, self.expand(key), mode, iv, encrypt=True)
+
+    def decrypt_into(self, src, key: Union[bytes, str], dst=None, mode: str = "ctr",
+                     iv: Optional[bytes] = None) -> int:
+        """Decrypt src into dst (in place when dst is None) and return the number of bytes processed."""
+        return self._transform_into(src, dst, self.expand(key), mode, iv, encrypt=False)
+
+    def encrypt_file_inplace(self, file_path: str, key: Union[bytes, str], mode: str = "ctr",
+                             iv: Optional[bytes] = None) -> int:
+        """Memory-map a file and encrypt it in place."""
+        return self._transform_file_inplace(file_path, self.expand(key), mode, iv, encrypt=True)
+
+    def decrypt_file_inplace(self, file_path: str, key: Union[bytes, str], mode: str = "ctr",
+                             iv: Optional[bytes] = None) -> int:
+        """Memory-map a file and decrypt it in place."""
+        return self._transform_file_inplace(file_path, self.expand(key), mode, iv, encrypt=False)
+
+    def _transform_file_inplace(self, file_path: str, schedule: "KeySchedule", mode: str,
+                                iv: Optional[bytes], encrypt: bool) -> int:
+        with open(file_path, 'r+b') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return 0
+            with mmap.mmap(file.fileno(), 0) as mapped:
+                processed = self._transform_into(mapped, None, schedule, mode, iv, encrypt)
+                mapped.flush()
+        return processed
+
+    @_timed("into")
+    def _transform_into(self, src, dst, schedule: "KeySchedule", mode: str, iv: Optional[bytes],
+                        encrypt: bool) -> int:
+        if mode not in STREAM_MODES:
+            raise ValueError(f"Mode must be one of {', '.join(STREAM_MODES)}")
+        if mode != "ecb" and (iv is None or len(iv) != 16):
+            raise ValueError("IV must be 16 bytes")
+        source = memoryview(src).cast('B')
+        target = source if dst is None else memoryview(dst).cast('B')
+        length = len(source)
+        if target.readonly:
+            raise TypeError("Output buffer must be writable")
+        if len(target) < length:
+            raise ValueError("Output buffer is smaller than the input")
+        if mode != "ctr" and length % 16 != 0:
+            raise ValueError("ECB and CBC buffers must be a multiple of 16 bytes")
+
+        if mode == "ecb" and self.engine == "compact" and self.metrics is None and self.on_round is None:
+            # Straight from the source blocks into the target, reusing the same two state buffers
+            blocks_into = self._encrypt_blocks_compact_into if encrypt else self._decrypt_blocks_compact_into
+            blocks_into(source, target, schedule, length)
+            return length
+
+        counter = int.from_bytes(iv, 'big') if mode == "ctr" else 0
+        previous = iv
+        for start in range(0, length, INTO_SPAN_SIZE):
+            stop = min(start + INTO_SPAN_SIZE, length)
+            span = source[start:stop]
+            if mode == "ctr":
+                out = self._ctr_segment(schedule, span, counter)
+                counter += (stop - start) // 16
+            elif mode == "cbc":
+                if encrypt:
+                    out = self._cbc_encrypt_blocks(schedule, span, previous)
+                    previous = out[-16:]
+                else:
+                    # Keep the last ciphertext block before an in-place write overwrites it
+                    next_previous = bytes(span[-16:])
+                    out = self._cbc_decrypt_segment(schedule, span, previous)
+                    previous = next_previous
+            elif encrypt:
+                out = self._ecb_encrypt_blocks(schedule, span)
+            else:
+                out = self._ecb_decrypt_blocks(schedule, span)
+            target[start:stop] = out
+        return length
+
     # PKCS#7 padding and unpadding functions
 
     def _pad_pkcs7(self, data: bytes) -> bytes:
         padding_length = 16 - (len(data) % 16)
         padding = bytes([padding_length] * padding_length)
-        print(f"Padding added: {padding.hex()}")
+        self._debug_print(f"Padding added: {padding.hex()}")
         return data + padding
 
     def _unpad_pkcs7(self, data: bytes) -> bytes:
@@ -144,42 +547,126 @@ class AES:
             raise ValueError("Inconsistent padding bytes detected during unpadding")
         return data[:-padding_length]
 
-
     # Encrypting a single block function
     def _encrypt_block(self, plaintext: bytes, key: bytes) -> bytes:
-        # Initialize the state and expand the key
+        return self._encrypt_scheduled(plaintext, self.expand(key))
+
+    # Decryption block function
+    def _decrypt_block(self, ciphertext: bytes, key: bytes) -> bytes:
+        return self._decrypt_scheduled(ciphertext, self.expand(key))
+
+    def _encrypt_scheduled(self, plaintext: bytes, schedule: "KeySchedule") -> bytes:
+        """Encrypt one block with an already expanded schedule on the selected engine."""
+        if self.engine == "ttable":
+            return self._encrypt_block_ttable(plaintext, schedule.words)
+        if self.engine == "compact":
+            out = bytearray(16)
+            self._encrypt_block_compact(plaintext, 0, out, 0, schedule.round_key_bytes, bytearray(16), bytearray(16))
+            return bytes(out)
+        return self._encrypt_block_reference(plaintext, schedule.round_keys)
+
+    def _decrypt_scheduled(self, ciphertext: bytes, schedule: "KeySchedule") -> bytes:
+        """Decrypt one block with an already expanded schedule on the selected engine."""
+        if self.engine == "ttable":
+            return self._decrypt_block_ttable(ciphertext, schedule.dec_words)
+        if self.engine == "compact":
+            out = bytearray(16)
+            self._decrypt_block_compact(ciphertext, 0, out, 0, schedule.dec_round_key_bytes,
+                                        bytearray(16), bytearray(16))
+            return bytes(out)
+        return self._decrypt_block_reference(ciphertext, schedule.dec_round_keys)
+
+    def _encrypt_scheduled_instrumented(self, plaintext: bytes, schedule: "KeySchedule") -> bytes:
+        """Block encryption used while instrumentation is installed."""
+        if self.on_round is not None:
+            block = self._encrypt_block_traced(plaintext, schedule.round_keys, self.on_round)
+        else:
+            block = AES._encrypt_scheduled(self, plaintext, schedule)
+        if self.metrics is not None:
+            self.metrics.count("blocks_encrypted")
+            self.metrics.count("bytes_encrypted", 16)
+        return block
+
+    def _decrypt_scheduled_instrumented(self, ciphertext: bytes, schedule: "KeySchedule") -> bytes:
+        """Block decryption used while instrumentation is installed."""
+        if self.on_round is not None:
+            block = self._decrypt_block_traced(ciphertext, schedule.dec_round_keys, self.on_round)
+        else:
+            block = AES._decrypt_scheduled(self, ciphertext, schedule)
+        if self.metrics is not None:
+            self.metrics.count("blocks_decrypted")
+            self.metrics.count("bytes_decrypted", 16)
+        return block
+
+    def _encrypt_block_traced(self, plaintext: bytes, round_keys: List[List[List[int]]],
+                              on_round: Callable[[str, int, List[List[int]]], None]) -> bytes:
+        """Reference block encryption reporting the state after every step."""
+        state = [[plaintext[i * 4 + j] for j in range(4)] for i in range(4)]
+
+        self.add_round_key(state, round_keys[0])
+        on_round("AddRoundKey", 0, state)
+        for round in range(1, self.rounds + 1):
+            self.sub_bytes(state)
+            on_round("SubBytes", round, state)
+            self.shift_rows(state)
+            on_round("ShiftRows", round, state)
+            if round < self.rounds:
+                self.mix_columns(state)
+                on_round("MixColumns", round, state)
+            self.add_round_key(state, round_keys[round])
+            on_round("AddRoundKey", round, state)
+        return bytes(state[i][j] for i in range(4) for j in range(4))
+
+    def _decrypt_block_traced(self, ciphertext: bytes, dec_round_keys: List[List[List[int]]],
+                              on_round: Callable[[str, int, List[List[int]]], None]) -> bytes:
+        """Reference block decryption reporting the state after every step."""
+        state = [[ciphertext[i * 4 + j] for j in range(4)] for i in range(4)]
+
+        self.add_round_key(state, dec_round_keys[0])
+        on_round("AddRoundKey", 0, state)
+        for round in range(1, self.rounds + 1):
+            self._inv_shift_rows(state)
+            on_round("InvShiftRows", round, state)
+            self._inv_sub_bytes(state)
+            on_round("InvSubBytes", round, state)
+            self.add_round_key(state, dec_round_keys[round])
+            on_round("AddRoundKey", round, state)
+            if round < self.rounds:
+                self._inv_mix_columns(state)
+                on_round("InvMixColumns", round, state)
+        return bytes(state[i][j] for i in range(4) for j in range(4))
+
+    def _encrypt_block_reference(self, plaintext: bytes, round_keys: List[List[List[int]]]) -> bytes:
+        # Initialize the state
         state = [[plaintext[i * 4 + j] for j in range(4)] for i in range(4)]
-        expanded_key = self.key_expansion(key)
 
         # Perform encryption steps
-        self.add_round_key(state, expanded_key[:4])  # Initial AddRoundKey
+        self.add_round_key(state, round_keys[0])  # Initial AddRoundKey
         for round in range(1, self.rounds):
             self.sub_bytes(state)
             self.shift_rows(state)
             self.mix_columns(state)
-            self.add_round_key(state, expanded_key[round * 4:(round + 1) * 4])
+            self.add_round_key(state, round_keys[round])
         # Final round (no MixColumns)
         self.sub_bytes(state)
         self.shift_rows(state)
-        self.add_round_key(state, expanded_key[self.rounds * 4:])
+        self.add_round_key(state, round_keys[self.rounds])
         return bytes(state[i][j] for i in range(4) for j in range(4))
 
-    # Decryption block function
-    def _decrypt_block(self, ciphertext: bytes, key: bytes) -> bytes:
-        # Decryption steps
+    def _decrypt_block_reference(self, ciphertext: bytes, dec_round_keys: List[List[List[int]]]) -> bytes:
+        # Decryption steps, with the round keys already in reverse order
         state = [[ciphertext[i * 4 + j] for j in range(4)] for i in range(4)]
-        expanded_key = self.key_expansion(key)
 
-        self.add_round_key(state, expanded_key[self.rounds * 4:])
-        for round in range(self.rounds - 1, 0, -1):
+        self.add_round_key(state, dec_round_keys[0])
+        for round in range(1, self.rounds):
             self._inv_shift_rows(state)
             self._inv_sub_bytes(state)
-            self.add_round_key(state, expanded_key[round * 4:(round + 1) * 4])
+            self.add_round_key(state, dec_round_keys[round])
             self._inv_mix_columns(state)
 
         self._inv_shift_rows(state)
         self._inv_sub_bytes(state)
-        self.add_round_key(state, expanded_key[:4])
+        self.add_round_key(state, dec_round_keys[self.rounds])
         return bytes(state[i][j] for i in range(4) for j in range(4))
 
     @staticmethod
@@ -187,7 +674,6 @@ class AES:
         for i in range(4):
             for j in range(4):
                 state[i][j] ^= round_key[i][j]
-        print(f"State after AddRoundKey: {hex_matrix(state)}")
 
     def sub_bytes(self, state):
         for i in range(4):
@@ -196,20 +682,143 @@ class AES:
                 state[i][j] = self.S_BOX[byte >> 4][byte & 0x0F]
 
     def key_expansion(self, key: bytes) -> List[List[int]]:
+        nk = len(key) // 4
         expanded_key = [list(key[i:i + 4]) for i in range(0, len(key), 4)]
-        for i in range(4, 4 * (self.rounds + 1)):
+        for i in range(nk, 4 * (self.rounds + 1)):
             temp = expanded_key[i - 1]
-            if i % 4 == 0:
+            if i % nk == 0:
                 temp = [self.S_BOX[b >> 4][b & 0x0F] for b in temp[1:] + temp[:1]]
-                temp[0] ^= self.RCON[i // 4 - 1]
-            expanded_key.append([expanded_key[i - 4][j] ^ temp[j] for j in range(4)])
+                temp[0] ^= self.RCON[i // nk - 1]
+            elif nk > 6 and i % nk == 4:
+                temp = [self.S_BOX[b >> 4][b & 0x0F] for b in temp]
+            expanded_key.append([expanded_key[i - nk][j] ^ temp[j] for j in range(4)])
         return expanded_key
 
+    def _encrypt_block_ttable(self, plaintext: bytes, words: List[int]) -> bytes:
+        """Encrypt one block on four column words using the combined T-tables."""
+        te0, te1, te2, te3, sbox = TE0, TE1, TE2, TE3, S_BOX_FLAT
+        s0 = int.from_bytes(plaintext[0:4], 'big') ^ words[0]
+        s1 = int.from_bytes(plaintext[4:8], 'big') ^ words[1]
+        s2 = int.from_bytes(plaintext[8:12], 'big') ^ words[2]
+        s3 = int.from_bytes(plaintext[12:16], 'big') ^ words[3]
+        k = 4
+        for _ in range(1, self.rounds):
+            t0 = te0[s0 >> 24] ^ te1[(s1 >> 16) & 0xFF] ^ te2[(s2 >> 8) & 0xFF] ^ te3[s3 & 0xFF] ^ words[k]
+            t1 = te0[s1 >> 24] ^ te1[(s2 >> 16) & 0xFF] ^ te2[(s3 >> 8) & 0xFF] ^ te3[s0 & 0xFF] ^ words[k + 1]
+            t2 = te0[s2 >> 24] ^ te1[(s3 >> 16) & 0xFF] ^ te2[(s0 >> 8) & 0xFF] ^ te3[s1 & 0xFF] ^ words[k + 2]
+            t3 = te0[s3 >> 24] ^ te1[(s0 >> 16) & 0xFF] ^ te2[(s1 >> 8) & 0xFF] ^ te3[s2 & 0xFF] ^ words[k + 3]
+            s0, s1, s2, s3 = t0, t1, t2, t3
+            k += 4
+        # Final round (no MixColumns): plain S-Box lookups on the shifted bytes
+        t0 = ((sbox[s0 >> 24] << 24) | (sbox[(s1 >> 16) & 0xFF] << 16)
+              | (sbox[(s2 >> 8) & 0xFF] << 8) | sbox[s3 & 0xFF]) ^ words[k]
+        t1 = ((sbox[s1 >> 24] << 24) | (sbox[(s2 >> 16) & 0xFF] << 16)
+              | (sbox[(s3 >> 8) & 0xFF] << 8) | sbox[s0 & 0xFF]) ^ words[k + 1]
+        t2 = ((sbox[s2 >> 24] << 24) | (sbox[(s3 >> 16) & 0xFF] << 16)
+              | (sbox[(s0 >> 8) & 0xFF] << 8) | sbox[s1 & 0xFF]) ^ words[k + 2]
+        t3 = ((sbox[s3 >> 24] << 24) | (sbox[(s0 >> 16) & 0xFF] << 16)
+              | (sbox[(s1 >> 8) & 0xFF] << 8) | sbox[s2 & 0xFF]) ^ words[k + 3]
+        return ((t0 << 96) | (t1 << 64) | (t2 << 32) | t3).to_bytes(16, 'big')
+
+    def _decrypt_block_ttable(self, ciphertext: bytes, dec_words: List[int]) -> bytes:
+        """Decrypt one block with the equivalent inverse cipher on column words and the inverse T-tables."""
+        td0, td1, td2, td3, inv_sbox = TD0, TD1, TD2, TD3, INV_S_BOX_FLAT
+        s0 = int.from_bytes(ciphertext[0:4], 'big') ^ dec_words[0]
+        s1 = int.from_bytes(ciphertext[4:8], 'big') ^ dec_words[1]
+        s2 = int.from_bytes(ciphertext[8:12], 'big') ^ dec_words[2]
+        s3 = int.from_bytes(ciphertext[12:16], 'big') ^ dec_words[3]
+        k = 4
+        for _ in range(1, self.rounds):
+            t0 = td0[s0 >> 24] ^ td1[(s3 >> 16) & 0xFF] ^ td2[(s2 >> 8) & 0xFF] ^ td3[s1 & 0xFF] ^ dec_words[k]
+            t1 = td0[s1 >> 24] ^ td1[(s0 >> 16) & 0xFF] ^ td2[(s3 >> 8) & 0xFF] ^ td3[s2 & 0xFF] ^ dec_words[k + 1]
+            t2 = td0[s2 >> 24] ^ td1[(s1 >> 16) & 0xFF] ^ td2[(s0 >> 8) & 0xFF] ^ td3[s3 & 0xFF] ^ dec_words[k + 2]
+            t3 = td0[s3 >> 24] ^ td1[(s2 >> 16) & 0xFF] ^ td2[(s1 >> 8) & 0xFF] ^ td3[s0 & 0xFF] ^ dec_words[k + 3]
+            s0, s1, s2, s3 = t0, t1, t2, t3
+            k += 4
+        # Final round (no InvMixColumns): plain inverse S-Box lookups on the shifted bytes
+        t0 = ((inv_sbox[s0 >> 24] << 24) | (inv_sbox[(s3 >> 16) & 0xFF] << 16)
+              | (inv_sbox[(s2 >> 8) & 0xFF] << 8) | inv_sbox[s1 & 0xFF]) ^ dec_words[k]
+        t1 = ((inv_sbox[s1 >> 24] << 24) | (inv_sbox[(s0 >> 16) & 0xFF] << 16)
+              | (inv_sbox[(s3 >> 8) & 0xFF] << 8) | inv_sbox[s2 & 0xFF]) ^ dec_words[k + 1]
+        t2 = ((inv_sbox[s2 >> 24] << 24) | (inv_sbox[(s1 >> 16) & 0xFF] << 16)
+              | (inv_sbox[(s0 >> 8) & 0xFF] << 8) | inv_sbox[s3 & 0xFF]) ^ dec_words[k + 2]
+        t3 = ((inv_sbox[s3 >> 24] << 24) | (inv_sbox[(s2 >> 16) & 0xFF] << 16)
+              | (inv_sbox[(s1 >> 8) & 0xFF] << 8) | inv_sbox[s0 & 0xFF]) ^ dec_words[k + 3]
+        return ((t0 << 96) | (t1 << 64) | (t2 << 32) | t3).to_bytes(16, 'big')
+
+    def _encrypt_blocks_compact_into(self, src, dst, schedule: "KeySchedule", length: int) -> None:
+        """ECB-encrypt length bytes of src into dst with one pair of state buffers for all blocks."""
+        state, temp = bytearray(16), bytearray(16)
+        round_key_bytes = schedule.round_key_bytes
+        encrypt_block = self._encrypt_block_compact
+        for offset in range(0, length, 16):
+            encrypt_block(src, offset, dst, offset, round_key_bytes, state, temp)
+
+    def _decrypt_blocks_compact_into(self, src, dst, schedule: "KeySchedule", length: int) -> None:
+        """ECB-decrypt length bytes of src into dst with one pair of state buffers for all blocks."""
+        state, temp = bytearray(16), bytearray(16)
+        dec_round_key_bytes = schedule.dec_round_key_bytes
+        decrypt_block = self._decrypt_block_compact
+        for offset in range(0, length, 16):
+            decrypt_block(src, offset, dst, offset, dec_round_key_bytes, state, temp)
+
+    def _encrypt_block_compact(self, src, src_offset: int, dst, dst_offset: int, round_key_bytes: bytes,
+                               state: bytearray, temp: bytearray) -> None:
+        """Encrypt the block at src[src_offset:] into dst[dst_offset:] using the caller's 16-byte buffers.
+
+        src and dst may be the same buffer: the block is read fully before the output is written.
+        """
+        sbox, mul2, shift = S_BOX_TUPLE, MUL2, SHIFT_ROWS_INDEX
+        for i in range(16):
+            state[i] = src[src_offset + i] ^ round_key_bytes[i]
+        k = 16
+        for _ in range(1, self.rounds):
+            # SubBytes and ShiftRows in one permuted pass into temp
+            for i in range(16):
+                temp[i] = sbox[state[shift[i]]]
+            # MixColumns and AddRoundKey back into state
+            for c in (0, 4, 8, 12):
+                a0, a1, a2, a3 = temp[c], temp[c + 1], temp[c + 2], temp[c + 3]
+                t = a0 ^ a1 ^ a2 ^ a3
+                state[c] = a0 ^ t ^ mul2[a0 ^ a1] ^ round_key_bytes[k + c]
+                state[c + 1] = a1 ^ t ^ mul2[a1 ^ a2] ^ round_key_bytes[k + c + 1]
+                state[c + 2] = a2 ^ t ^ mul2[a2 ^ a3] ^ round_key_bytes[k + c + 2]
+                state[c + 3] = a3 ^ t ^ mul2[a3 ^ a0] ^ round_key_bytes[k + c + 3]
+            k += 16
+        # Final round (no MixColumns), written straight to the output
+        for i in range(16):
+            dst[dst_offset + i] = sbox[state[shift[i]]] ^ round_key_bytes[k + i]
+
+    def _decrypt_block_compact(self, src, src_offset: int, dst, dst_offset: int, dec_round_key_bytes: bytes,
+                               state: bytearray, temp: bytearray) -> None:
+        """Decrypt the block at src[src_offset:] into dst[dst_offset:] using the caller's 16-byte buffers."""
+        inv_sbox, inv_shift = INV_S_BOX_TUPLE, INV_SHIFT_ROWS_INDEX
+        mul9, mul11, mul13, mul14 = MUL9, MUL11, MUL13, MUL14
+        for i in range(16):
+            state[i] = src[src_offset + i] ^ dec_round_key_bytes[i]
+        k = 16
+        for _ in range(1, self.rounds):
+            # InvShiftRows, InvSubBytes and AddRoundKey in one permuted pass into temp
+            for i in range(16):
+                temp[i] = inv_sbox[state[inv_shift[i]]] ^ dec_round_key_bytes[k + i]
+            # InvMixColumns back into state
+            for c in (0, 4, 8, 12):
+                a0, a1, a2, a3 = temp[c], temp[c + 1], temp[c + 2], temp[c + 3]
+                state[c] = mul14[a0] ^ mul11[a1] ^ mul13[a2] ^ mul9[a3]
+                state[c + 1] = mul9[a0] ^ mul14[a1] ^ mul11[a2] ^ mul13[a3]
+                state[c + 2] = mul13[a0] ^ mul9[a1] ^ mul14[a2] ^ mul11[a3]
+                state[c + 3] = mul11[a0] ^ mul13[a1] ^ mul9[a2] ^ mul14[a3]
+            k += 16
+        for i in range(16):
+            dst[dst_offset + i] = inv_sbox[state[inv_shift[i]]] ^ dec_round_key_bytes[k + i]
+
     @staticmethod
     def shift_rows(state):
-        state[1] = state[1][1:] + state[1][:1]
-        state[2] = state[2][2:] + state[2][:2]
-        state[3] = state[3][3:] + state[3][:3]
+        # state[c] holds column c, so row r is state[0][r]..state[3][r]
+        for r in range(1, 4):
+            row = [state[(c + r) % 4][r] for c in range(4)]
+            for c in range(4):
+                state[c][r] = row[c]
 
     def mix_columns(self, state):
         for i in range(4):
@@ -218,7 +827,6 @@ class AES:
             state[i][1] = a[0] ^ self.gf_mul(a[1], 2) ^ self.gf_mul(a[2], 3) ^ a[3]
             state[i][2] = a[0] ^ a[1] ^ self.gf_mul(a[2], 2) ^ self.gf_mul(a[3], 3)
             state[i][3] = self.gf_mul(a[0], 3) ^ a[1] ^ a[2] ^ self.gf_mul(a[3], 2)
-        print(f"State after MixColumns: {hex_matrix(state)}")
 
     @staticmethod
     def gf_mul(a, b):
@@ -243,9 +851,10 @@ class AES:
     @staticmethod
     def _inv_shift_rows(state: List[List[int]]) -> None:
         """Inverse shift rows transformation."""
-        state[1] = state[1][-1:] + state[1][:-1]
-        state[2] = state[2][-2:] + state[2][:-2]
-        state[3] = state[3][-3:] + state[3][:-3]
+        for r in range(1, 4):
+            row = [state[(c - r) % 4][r] for c in range(4)]
+            for c in range(4):
+                state[c][r] = row[c]
 
     def _inv_mix_columns(self, state: List[List[int]]) -> None:
         """Inverse mix columns transformation."""
@@ -263,3 +872,150 @@ class AES:
     @staticmethod
     def generate_key(key_size=128):
         return os.urandom(key_size // 8)
+
+
+_BLOCK_MASK = (1 << 128) - 1
+
+# Cipher and schedule installed in each pool worker by _init_segment_worker
+_segment_worker = None
+
+
+def _resolve_workers(workers: Optional[int]) -> int:
+    """None means one worker per CPU."""
+    return (os.cpu_count() or 1) if workers is None else max(1, workers)
+
+
+def _segment_size(length: int, workers: int) -> int:
+    """Segment size giving each worker about four segments, never below MIN_PARALLEL_SEGMENT, in whole blocks."""
+    if workers <= 1:
+        return max(length, 16)
+    size = max(MIN_PARALLEL_SEGMENT, -(-length // (workers * 4)))
+    return (size + 15) // 16 * 16
+
+
+def _init_segment_worker(key_size: int, engine: str, schedule: "KeySchedule") -> None:
+    global _segment_worker
+    _segment_worker = (AES(key_size, engine), schedule)
+
+
+def _run_segment_task(task: Tuple) -> bytes:
+    method, *args = task
+    aes, schedule = _segment_worker
+    return getattr(aes, method)(schedule, *args)
+
+
+def _inv_mix_column_word(word: int) -> int:
+    """InvMixColumns of one column word, via the inverse T-tables (S-Box first cancels their InvSubBytes)."""
+    return (TD0[S_BOX_FLAT[word >> 24]] ^ TD1[S_BOX_FLAT[(word >> 16) & 0xFF]]
+            ^ TD2[S_BOX_FLAT[(word >> 8) & 0xFF]] ^ TD3[S_BOX_FLAT[word & 0xFF]])
+
+
+class KeySchedule:
+    """Round keys for one AES key, expanded once in the forms the engines consume."""
+
+    def __init__(self, aes: AES, key: bytes):
+        expanded_key = aes.key_expansion(key)
+        self.key = key
+        # Four words per round for the reference engine, in encryption and decryption order
+        self.round_keys = [expanded_key[r * 4:(r + 1) * 4] for r in range(aes.rounds + 1)]
+        self.dec_round_keys = self.round_keys[::-1]
+        # Flat byte strings of the same round keys for the compact engine
+        self.round_key_bytes = bytes(b for word in expanded_key for b in word)
+        self.dec_round_key_bytes = b''.join(bytes(b for word in round_key for b in word)
+                                            for round_key in self.dec_round_keys)
+        # The same words packed into 32-bit integers for the T-table engine
+        self.words = [(w[0] << 24) | (w[1] << 16) | (w[2] << 8) | w[3] for w in expanded_key]
+        # Equivalent inverse cipher keys: reverse round order, InvMixColumns applied to the inner rounds
+        self.dec_words = []
+        for round in range(aes.rounds, -1, -1):
+            for word in self.words[round * 4:(round + 1) * 4]:
+                if 0 < round < aes.rounds:
+                    word = _inv_mix_column_word(word)
+                self.dec_words.append(word)
+
+
+class KeyScheduleCache:
+    """Bounded LRU cache of KeySchedule objects keyed by the key bytes."""
+
+    def __init__(self, maxsize: int = 128):
+        if maxsize < 1:
+            raise ValueError("Cache size must be at least 1")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._schedules: "OrderedDict[bytes, KeySchedule]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, aes: AES, key: bytes) -> KeySchedule:
+        """Return the cached schedule for key, expanding and storing it on a miss."""
+        with self._lock:
+            schedule = self._schedules.get(key)
+            if schedule is not None:
+                self._schedules.move_to_end(key)
+                self.hits += 1
+                return schedule
+            self.misses += 1
+
+        schedule = aes._new_schedule(key)
+        with self._lock:
+            self._schedules[key] = schedule
+            self._schedules.move_to_end(key)
+            while len(self._schedules) > self.maxsize:
+                self._schedules.popitem(last=False)
+        return schedule
+
+    def clear(self) -> None:
+        """Drop every cached schedule and reset the counters."""
+        with self._lock:
+            self._schedules.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> Dict[str, int]:
+        """Return the hit/miss counters and current size."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "size": len(self._schedules), "maxsize": self.maxsize}
+
+    def __len__(self) -> int:
+        return len(self._schedules)
+
+
+class AESContext:
+    """AES bound to a single key: the key is parsed and its schedules expanded only once."""
+
+    def __init__(self, aes: AES, key: Union[bytes, str]):
+        self.aes = aes
+        self.schedule = aes.expand(key)
+
+    @property
+    def key_size(self) -> int:
+        return self.aes.key_size
+
+    def encrypt(self, plaintext: Union[bytes, str]) -> bytes:
+        """Pad and encrypt plaintext with the bound key."""
+        return self.aes._encrypt_with_schedule(plaintext, self.schedule)
+
+    def decrypt(self, ciphertext: bytes) -> bytes:
+        """Decrypt and unpad ciphertext with the bound key."""
+        return self.aes._decrypt_with_schedule(ciphertext, self.schedule)
+
+    def encrypt_block(self, block: bytes) -> bytes:
+        """Encrypt a single 16-byte block."""
+        return self.aes._encrypt_scheduled(block, self.schedule)
+
+    def decrypt_block(self, block: bytes) -> bytes:
+        """Decrypt a single 16-byte block."""
+        return self.aes._decrypt_scheduled(block, self.schedule)
+
+    def encrypt_ctr(self, data: Union[bytes, str], nonce: bytes, workers: Optional[int] = 1) -> bytes:
+        return self.aes._ctr_with_schedule(data, self.schedule, nonce, workers)
+
+    def decrypt_ctr(self, data: bytes, nonce: bytes, workers: Optional[int] = 1) -> bytes:
+        return self.aes._ctr_with_schedule(data, self.schedule, nonce, workers)
+
+    def encrypt_cbc(self, plaintext: Union[bytes, str], iv: bytes) -> bytes:
+        return self.aes._cbc_encrypt_with_schedule(plaintext, self.schedule, iv)
+
+    def decrypt_cbc(self, ciphertext: bytes, iv: bytes, workers: Optional[int] = 1) -> bytes:
+        return self.aes._cbc_decrypt_with_schedule(ciphertext, self.schedule, iv, workers)
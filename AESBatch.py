@@ -0,0 +1,143 @@
+import numpy as np
+from typing import Union
+
+from AES import AES, S_BOX_FLAT, INV_S_BOX_FLAT, TE0, TE1, TE2, TE3, TD0, TD1, TD2, TD3
+
+# Lookup tables as arrays so a whole batch is substituted with one fancy-indexing gather
+_S_BOX = np.array(S_BOX_FLAT, dtype=np.uint8)
+_INV_S_BOX = np.array(INV_S_BOX_FLAT, dtype=np.uint8)
+_TE0 = np.array(TE0, dtype=np.uint32)
+_TE1 = np.array(TE1, dtype=np.uint32)
+_TE2 = np.array(TE2, dtype=np.uint32)
+_TE3 = np.array(TE3, dtype=np.uint32)
+_TD0 = np.array(TD0, dtype=np.uint32)
+_TD1 = np.array(TD1, dtype=np.uint32)
+_TD2 = np.array(TD2, dtype=np.uint32)
+_TD3 = np.array(TD3, dtype=np.uint32)
+
+# Column c of ShiftRows output takes row r from column (c + r) % 4, InvShiftRows from column (c - r) % 4
+_NEXT_COLUMN = [1, 2, 3, 0]
+_PREVIOUS_COLUMN = [3, 0, 1, 2]
+
+# Blocks processed per vectorized pass, bounding the size of the temporaries (1 MiB of data)
+BATCH_BLOCKS = 65536
+
+
+class BatchAES:
+    """AES over batches of blocks held in an (N, 16) uint8 array, one round at a time for all N."""
+
+    def __init__(self, key: Union[bytes, str], batch_blocks: int = BATCH_BLOCKS):
+        key = AES._coerce_key(key)
+        self.aes = AES(len(key) * 8)
+        self.rounds = self.aes.rounds
+        self.batch_blocks = batch_blocks
+        schedule = self.aes.expand(key)
+        self._enc_words = np.array(schedule.words, dtype=np.uint32).reshape(self.rounds + 1, 4)
+        self._dec_words = np.array(schedule.dec_words, dtype=np.uint32).reshape(self.rounds + 1, 4)
+
+    @staticmethod
+    def to_blocks(data: bytes) -> np.ndarray:
+        """View data (a multiple of 16 bytes) as an (N, 16) uint8 array."""
+        if len(data) % 16 != 0:
+            raise ValueError("Data length must be a multiple of 16 bytes")
+        return np.frombuffer(data, dtype=np.uint8).reshape(-1, 16)
+
+    def encrypt_blocks(self, blocks: np.ndarray) -> np.ndarray:
+        """Encrypt an (N, 16) uint8 array of blocks with the T-tables."""
+        words = self._enc_words
+        state = blocks.reshape(-1, 16).view('>u4').astype(np.uint32) ^ words[0]
+        for r in range(1, self.rounds):
+            s1 = state[:, _NEXT_COLUMN]
+            s2 = s1[:, _NEXT_COLUMN]
+            s3 = s2[:, _NEXT_COLUMN]
+            state = (_TE0[state >> 24] ^ _TE1[(s1 >> 16) & 0xFF]
+                     ^ _TE2[(s2 >> 8) & 0xFF] ^ _TE3[s3 & 0xFF] ^ words[r])
+        # Final round (no MixColumns)
+        s1 = state[:, _NEXT_COLUMN]
+        s2 = s1[:, _NEXT_COLUMN]
+        s3 = s2[:, _NEXT_COLUMN]
+        state = ((_S_BOX[state >> 24].astype(np.uint32) << 24)
+                 | (_S_BOX[(s1 >> 16) & 0xFF].astype(np.uint32) << 16)
+                 | (_S_BOX[(s2 >> 8) & 0xFF].astype(np.uint32) << 8)
+                 | _S_BOX[s3 & 0xFF]) ^ words[self.rounds]
+        return state.astype('>u4').view(np.uint8).reshape(-1, 16)
+
+    def decrypt_blocks(self, blocks: np.ndarray) -> np.ndarray:
+        """Decrypt an (N, 16) uint8 array of blocks with the equivalent inverse cipher and inverse T-tables."""
+        words = self._dec_words
+        state = blocks.reshape(-1, 16).view('>u4').astype(np.uint32) ^ words[0]
+        for r in range(1, self.rounds):
+            s1 = state[:, _PREVIOUS_COLUMN]
+            s2 = s1[:, _PREVIOUS_COLUMN]
+            s3 = s2[:, _PREVIOUS_COLUMN]
+            state = (_TD0[state >> 24] ^ _TD1[(s1 >> 16) & 0xFF]
+                     ^ _TD2[(s2 >> 8) & 0xFF] ^ _TD3[s3 & 0xFF] ^ words[r])
+        # Final round (no InvMixColumns)
+        s1 = state[:, _PREVIOUS_COLUMN]
+        s2 = s1[:, _PREVIOUS_COLUMN]
+        s3 = s2[:, _PREVIOUS_COLUMN]
+        state = ((_INV_S_BOX[state >> 24].astype(np.uint32) << 24)
+                 | (_INV_S_BOX[(s1 >> 16) & 0xFF].astype(np.uint32) << 16)
+                 | (_INV_S_BOX[(s2 >> 8) & 0xFF].astype(np.uint32) << 8)
+                 | _INV_S_BOX[s3 & 0xFF]) ^ words[self.rounds]
+        return state.astype('>u4').view(np.uint8).reshape(-1, 16)
+
+    def _map_batches(self, function, blocks: np.ndarray) -> np.ndarray:
+        """Apply a block function batch by batch into one output array."""
+        out = np.empty_like(blocks)
+        for start in range(0, len(blocks), self.batch_blocks):
+            stop = start + self.batch_blocks
+            out[start:stop] = function(blocks[start:stop])
+        return out
+
+    def encrypt_ecb(self, plaintext: Union[bytes, str]) -> bytes:
+        """PKCS#7-pad and encrypt in ECB mode; same output as AES.encrypt."""
+        if isinstance(plaintext, str):
+            plaintext = plaintext.encode('utf-8')
+        blocks = self.to_blocks(self.aes._pad_pkcs7(plaintext))
+        return self._map_batches(self.encrypt_blocks, blocks).tobytes()
+
+    def decrypt_ecb(self, ciphertext: bytes) -> bytes:
+        """Decrypt in ECB mode and remove the PKCS#7 padding; same output as AES.decrypt."""
+        blocks = self.to_blocks(ciphertext)
+        return self.aes._unpad_pkcs7(self._map_batches(self.decrypt_blocks, blocks).tobytes())
+
+    # Same interface as AESContext.encrypt/decrypt, so BatchAES can stand in for it
+    encrypt = encrypt_ecb
+    decrypt = decrypt_ecb
+
+    @staticmethod
+    def counter_blocks(nonce: bytes, start_block: int, count: int) -> np.ndarray:
+        """Counter blocks nonce + start_block .. nonce + start_block + count - 1 (128-bit big-endian, wrapping)."""
+        if len(nonce) != 16:
+            raise ValueError("Nonce must be 16 bytes")
+        first = (int.from_bytes(nonce, 'big') + start_block) % (1 << 128)
+        high = np.uint64(first >> 64)
+        low = np.uint64(first & 0xFFFFFFFFFFFFFFFF)
+        low_words = low + np.arange(count, dtype=np.uint64)  # wraps modulo 2^64
+        high_words = high + (low_words < low).astype(np.uint64)
+        counters = np.empty((count, 2), dtype='>u8')
+        counters[:, 0] = high_words
+        counters[:, 1] = low_words
+        return counters.view(np.uint8).reshape(count, 16)
+
+    def keystream(self, nonce: bytes, start_block: int, length: int) -> np.ndarray:
+        """CTR keystream of length bytes starting at block start_block."""
+        count = (length + 15) // 16
+        stream = np.empty((count, 16), dtype=np.uint8)
+        for start in range(0, count, self.batch_blocks):
+            batch = min(self.batch_blocks, count - start)
+            counters = self.counter_blocks(nonce, start_block + start, batch)
+            stream[start:start + batch] = self.encrypt_blocks(counters)
+        return stream.reshape(-1)[:length]
+
+    def encrypt_ctr(self, data: Union[bytes, str], nonce: bytes, start_block: int = 0) -> bytes:
+        """Encrypt (or decrypt) data in CTR mode; no padding is applied."""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        stream = self.keystream(nonce, start_block, len(data))
+        return (np.frombuffer(data, dtype=np.uint8) ^ stream).tobytes()
+
+    def decrypt_ctr(self, data: bytes, nonce: bytes, start_block: int = 0) -> bytes:
+        """CTR decryption is the same keystream XOR as encryption."""
+        return self.encrypt_ctr(data, nonce, start_block)
@@ -1,11 +1,14 @@
 import hashlib
 import binascii
-from typing import Tuple, List
+import json
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Iterator, Optional, Tuple, List
 import RC4
 from AES import AES
+from AvalancheSweep import bit_difference
+from Cascade import CascadeCipher
 import os
-import pdfplumber
-from fpdf import FPDF
 
 def save_as_txt(file_path, data):
     """Saves the data as a .txt file."""
@@ -19,6 +22,7 @@ def save_as_txt(file_path, data):
 def save_as_pdf(file_path, data):
     """Saves the data as a .pdf file."""
     try:
+        from fpdf import FPDF  # imported here so cipher-only users never load it
         pdf = FPDF()
         pdf.set_auto_page_break(auto=True, margin=15)
         pdf.add_page()
@@ -33,13 +37,74 @@ def save_as_pdf(file_path, data):
     except Exception as e:
         print(f"An error occurred while saving the .pdf file: {e}")
 
-def read_pdf_file(file_path):
+# Extracted PDF text is cached here, keyed by file content hash and modification time
+PDF_CACHE_DIR = os.environ.get("PDF_TEXT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "pdf_text"))
+
+# Pages extracted per worker task; each task opens the PDF once
+PDF_PAGES_PER_TASK = 4
+
+
+def _pdf_cache_path(file_path: str, cache_dir: str) -> str:
+    """Cache file for the current content and mtime of file_path."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    mtime = os.stat(file_path).st_mtime_ns
+    return os.path.join(cache_dir, f"{digest.hexdigest()}-{mtime}.json")
+
+
+def _extract_pdf_pages(file_path: str, page_numbers: List[int]) -> List[str]:
+    """Extract the text of the given pages; pages without text yield an empty string."""
+    import pdfplumber
+    with pdfplumber.open(file_path) as pdf:
+        return [pdf.pages[n].extract_text() or "" for n in page_numbers]
+
+
+def iter_pdf_pages(file_path: str, workers: Optional[int] = None, cache_dir: Optional[str] = PDF_CACHE_DIR) -> Iterator[str]:
+    """Yield the text of each page in order, extracting pages in parallel on a process pool.
+
+    Pages are yielded as soon as they are ready, so callers can start on page 1 early. The full result is
+    cached on disk (cache_dir=None disables the cache) and later runs on the same file skip extraction.
+    """
+    cache_path = _pdf_cache_path(file_path, cache_dir) if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, encoding='utf-8') as file:
+            yield from json.load(file)
+        return
+
+    import pdfplumber  # heavy; only loaded when a PDF actually has to be parsed
+    with pdfplumber.open(file_path) as pdf:
+        page_count = len(pdf.pages)
+    tasks = [list(range(start, min(start + PDF_PAGES_PER_TASK, page_count)))
+             for start in range(0, page_count, PDF_PAGES_PER_TASK)]
+    workers = min((os.cpu_count() or 1) if workers is None else max(1, workers), len(tasks))
+
+    pages = []
+    if workers <= 1:
+        for task in tasks:
+            for text in _extract_pdf_pages(file_path, task):
+                pages.append(text)
+                yield text
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for batch in pool.map(_extract_pdf_pages, [file_path] * len(tasks), tasks):
+                for text in batch:
+                    pages.append(text)
+                    yield text
+
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(pages, file)
+        os.replace(temp_path, cache_path)
+
+
+def read_pdf_file(file_path, workers: Optional[int] = None, cache_dir: Optional[str] = PDF_CACHE_DIR):
     try:
-        with pdfplumber.open(file_path) as pdf:
-            text = ""
-            for page in pdf.pages:
-                text += page.extract_text() + "\n"
-            return text.encode('utf-8')  # Return as bytes
+        text = "".join(page + "\n" for page in iter_pdf_pages(file_path, workers, cache_dir))
+        return text.encode('utf-8')  # Return as bytes
     except FileNotFoundError:
         print(f"The file {file_path} was not found.")
     except Exception as e:
@@ -55,12 +120,17 @@ def safe_decode(data: bytes) -> str:
         print(f"Warning: Non-UTF-8 bytes detected in: {data.hex()}")
         return data.hex()  # Fallback to hex representation
 
+@lru_cache(maxsize=32)
+def _cascade(rc4_key: bytes, aes_key: bytes) -> CascadeCipher:
+    return CascadeCipher(rc4_key, aes_key)
+
 def combined_rc4_aes_encrypt(plaintext: bytes, rc4_key: bytes, aes_key: bytes) -> bytes:
-    """Encrypts plaintext using RC4, then AES."""
-    rc4_encrypted = RC4.rc4_encrypt(plaintext, rc4_key)
-    aes = AES(key_size=128)
-    aes_encrypted = aes.encrypt(rc4_encrypted, aes_key)
-    return aes_encrypted
+    """Encrypts plaintext using RC4, then AES (any AES key size); large inputs run both stages in parallel."""
+    return _cascade(rc4_key, aes_key).encrypt(plaintext)
+
+def combined_rc4_aes_decrypt(ciphertext: bytes, rc4_key: bytes, aes_key: bytes) -> bytes:
+    """Reverses combined_rc4_aes_encrypt: AES decryption, then RC4."""
+    return _cascade(rc4_key, aes_key).decrypt(ciphertext)
 
 
 def read_text_file(file_path):
@@ -76,7 +146,7 @@ def read_text_file(file_path):
 
 def calculate_avalanche_effect(cipher1: bytes, cipher2: bytes) -> float:
     """Calculates the avalanche effect between two ciphertexts."""
-    bit_diff = sum(bin(b1 ^ b2).count('1') for b1, b2 in zip(cipher1, cipher2))
+    bit_diff = bit_difference(cipher1, cipher2)
     total_bits = len(cipher1) * 8
     return (bit_diff / total_bits) * 100
 
@@ -89,6 +159,20 @@ def modify_key(key: bytes, modifications: List[Tuple[int, str]]) -> List[bytes]:
         modified_keys.append(bytes(key_list))  # Convert the list back to bytes
     return modified_keys
 
+# Fewest keys for which the NumPy batch beats per-key rc4_encrypt. The batch loops over every keystream byte in
+# Python, whatever the key count, so it only wins once that loop is shared by enough keys (~40-50, measured
+# for 256 B to 20 KB messages)
+RC4_BATCH_MIN_KEYS = 48
+
+def rc4_encrypt_keys(data: bytes, keys: List[bytes]) -> List[bytes]:
+    """RC4-encrypts data under every key; many keys go through one vectorized pass when NumPy is available."""
+    if len(keys) >= RC4_BATCH_MIN_KEYS:
+        try:
+            return [row.tobytes() for row in RC4.rc4_encrypt_batch(data, keys)]
+        except ImportError:
+            pass
+    return [RC4.rc4_encrypt(data, key) for key in keys]
+
 def analyze_files(file1_path: str, file2_path: str, aes_key: bytes, rc4_key: bytes, aes_modifications: List[Tuple[int, str]], rc4_modifications: List[Tuple[int, str]]) -> None:
     # Initialize AES with a 128-bit key
     aes = AES(key_size=128)
@@ -164,7 +248,8 @@ def analyze_files(file1_path: str, file2_path: str, aes_key: bytes, rc4_key: byt
     # Modify keys and perform analysis
     modified_aes_keys = modify_key(aes_key, aes_modifications)
     modified_rc4_keys = modify_key(rc4_key, rc4_modifications)
-
+    rc4_ciphers1_modified = rc4_encrypt_keys(file1, modified_rc4_keys)
+    rc4_ciphers2_modified = rc4_encrypt_keys(file2, modified_rc4_keys)
     
     for i, (mod_aes_key, mod_rc4_key) in enumerate(zip(modified_aes_keys, modified_rc4_keys)):
         # AES Analysis
@@ -175,10 +260,10 @@ def analyze_files(file1_path: str, file2_path: str, aes_key: bytes, rc4_key: byt
         aes_avalanche2 = calculate_avalanche_effect(aes_cipher2, aes_cipher2_modified)
         
         # RC4 Analysis
-        rc4_cipher1_modified = RC4.rc4_encrypt(file1, mod_rc4_key)
+        rc4_cipher1_modified = rc4_ciphers1_modified[i]
         rc4_avalanche1 = calculate_avalanche_effect(rc4_cipher1, rc4_cipher1_modified)
         
-        rc4_cipher2_modified = RC4.rc4_encrypt(file2, mod_rc4_key)
+        rc4_cipher2_modified = rc4_ciphers2_modified[i]
         rc4_avalanche2 = calculate_avalanche_effect(rc4_cipher2, rc4_cipher2_modified)
         
         # RC4-AES Analysis
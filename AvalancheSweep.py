@@ -0,0 +1,294 @@
+"""Bit-flip avalanche sweeps: flip every key or plaintext bit and measure how much of the ciphertext changes.
+
+Usage:
+    python AvalancheSweep.py --algorithm aes --key 000102030405060708090a0b0c0d0e0f --file File1.txt --csv aes_key.csv
+    python AvalancheSweep.py --algorithm rc4 --key myrc4secretkey --file File1.txt --target plaintext --npz rc4.npz
+"""
+import argparse
+import csv
+import os
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import Backends
+from AES import AES
+from RC4 import RC4
+
+
+ALGORITHMS = ("aes", "rc4")
+TARGETS = ("key", "plaintext")
+
+# Flipped bits handed to a worker per task
+BITS_PER_TASK = 8
+
+
+@lru_cache(maxsize=None)
+def _numpy():
+    """numpy, imported on first use so importing this module stays cheap; None when it is not installed.
+
+    numpy is optional: sweeps fall back to int.bit_count, and Backends.py only offers its NumPy AES when it is installed.
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+@lru_cache(maxsize=None)
+def _popcount_table():
+    np = _numpy()
+    return np.array([bin(x).count('1') for x in range(256)], dtype=np.uint8)
+
+
+def bit_difference(cipher1: bytes, cipher2: bytes) -> int:
+    """Number of differing bits over the common length of two buffers."""
+    length = min(len(cipher1), len(cipher2))
+    return (int.from_bytes(cipher1[:length], 'big') ^ int.from_bytes(cipher2[:length], 'big')).bit_count()
+
+
+def _span_layout(length: int, columns: int) -> Tuple[int, int]:
+    """Number of spans and span size used to split `length` bytes into at most `columns` spans."""
+    columns = max(1, min(columns, length)) if length else 1
+    return columns, (length // columns if length else 0)
+
+
+def span_bit_differences(cipher1: bytes, cipher2: bytes, columns: int) -> List[int]:
+    """Differing bits in each of `columns` equal spans of the common length (the last span takes the remainder)."""
+    length = min(len(cipher1), len(cipher2))
+    columns, span = _span_layout(length, columns)
+    starts = [c * span for c in range(columns)]
+    np = _numpy()
+    if np is not None and length:
+        xored = np.bitwise_xor(np.frombuffer(cipher1, dtype=np.uint8, count=length),
+                               np.frombuffer(cipher2, dtype=np.uint8, count=length))
+        return np.add.reduceat(_popcount_table()[xored].astype(np.int64), starts).tolist()
+    ends = starts[1:] + [length]
+    return [bit_difference(cipher1[start:end], cipher2[start:end]) for start, end in zip(starts, ends)]
+
+
+def flip_bit(data: bytes, bit: int) -> bytes:
+    """Return data with one bit inverted; bit 0 is the most significant bit of the first byte."""
+    flipped = bytearray(data)
+    flipped[bit // 8] ^= 0x80 >> (bit % 8)
+    return bytes(flipped)
+
+
+def make_encryptor(algorithm: str, key: bytes, size_hint: Optional[int] = None) -> Callable[[bytes], bytes]:
+    """Encryption function for one key, from the backend Backends.py calibrated for size_hint-byte payloads."""
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Algorithm must be one of {', '.join(ALGORITHMS)}")
+    return Backends.new(algorithm, key, size_hint).encrypt
+
+
+class IncrementalAvalanche:
+    """Baseline encryption kept per block (AES, ECB) or as a keystream (RC4) for plaintext-modification studies.
+
+    A modification only re-encrypts the ECB blocks it touches, or reuses the RC4 keystream, and is compared
+    with the cached baseline, so the cost scales with the number of changed bytes rather than the file size.
+    An already computed baseline ciphertext can be passed in (the RC4 keystream is recovered from it), so
+    workers that share one baseline do not each re-encrypt the whole plaintext.
+    """
+
+    def __init__(self, algorithm: str, key: bytes, plaintext: bytes, baseline: Optional[bytes] = None):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Algorithm must be one of {', '.join(ALGORITHMS)}")
+        self.algorithm = algorithm
+        self.plaintext = plaintext
+        if algorithm == "aes":
+            self.context = AES.new(key, engine="ttable")
+            self.padded = self.context.aes._pad_pkcs7(plaintext)
+            if baseline is None:
+                baseline = make_encryptor(algorithm, key, len(plaintext))(plaintext)
+            elif len(baseline) != len(self.padded):
+                raise ValueError("Baseline must be the ECB encryption of the plaintext")
+            self.baseline = baseline
+        else:
+            if baseline is None:
+                self.keystream = RC4(key).keystream(len(plaintext))
+                baseline = (int.from_bytes(plaintext, 'big')
+                            ^ int.from_bytes(self.keystream, 'big')).to_bytes(len(plaintext), 'big')
+            elif len(baseline) != len(plaintext):
+                raise ValueError("Baseline must be the RC4 encryption of the plaintext")
+            else:
+                self.keystream = (int.from_bytes(plaintext, 'big')
+                                  ^ int.from_bytes(baseline, 'big')).to_bytes(len(plaintext), 'big')
+            self.baseline = baseline
+        self.total_bits = len(self.baseline) * 8
+
+    def mutated_pieces(self, modifications: Sequence[Tuple[int, Union[int, str]]]) -> List[Tuple[int, bytes]]:
+        """(offset, new ciphertext bytes) for every part of the ciphertext the modifications change.
+
+        Each modification is (position, new byte), the byte given as an int or a one-character string.
+        """
+        changes: Dict[int, int] = {}
+        for position, value in modifications:
+            if not 0 <= position < len(self.plaintext):
+                raise IndexError(f"Position {position} is outside the plaintext")
+            changes[position] = ord(value) if isinstance(value, str) else value
+
+        if self.algorithm == "rc4":
+            return [(position, bytes([value ^ self.keystream[position]])) for position, value in sorted(changes.items())]
+
+        blocks: Dict[int, bytearray] = {}
+        for position, value in changes.items():
+            start = position - position % 16
+            block = blocks.setdefault(start, bytearray(self.padded[start:start + 16]))
+            block[position - start] = value
+        return [(start, self.context.encrypt_block(bytes(block))) for start, block in sorted(blocks.items())]
+
+    def changed_bits(self, modifications: Sequence[Tuple[int, Union[int, str]]]) -> int:
+        """Ciphertext bits that differ from the baseline after applying the modifications."""
+        return sum(bit_difference(piece, self.baseline[offset:offset + len(piece)])
+                   for offset, piece in self.mutated_pieces(modifications))
+
+    def avalanche_effect(self, modifications: Sequence[Tuple[int, Union[int, str]]]) -> float:
+        """Same percentage as calculate_avalanche_effect on a full re-encryption of the modified plaintext."""
+        return self.changed_bits(modifications) / self.total_bits * 100 if self.total_bits else 0.0
+
+    def span_differences(self, modifications: Sequence[Tuple[int, Union[int, str]]], columns: int) -> List[int]:
+        """Same result as span_bit_differences against a full re-encryption of the modified plaintext."""
+        columns, span = _span_layout(len(self.baseline), columns)
+        row = [0] * columns
+        for offset, piece in self.mutated_pieces(modifications):
+            for index, (new, old) in enumerate(zip(piece, self.baseline[offset:offset + len(piece)])):
+                row[min((offset + index) // span, columns - 1)] += (new ^ old).bit_count()
+        return row
+
+
+class SweepResult:
+    """Per-flipped-bit avalanche results.
+
+    matrix[r][c] is the number of ciphertext bits that changed in output span c when input bit bits[r] was
+    flipped; percentages[r] is the share of all ciphertext bits that changed.
+    """
+
+    def __init__(self, algorithm: str, target: str, bits: Sequence[int], matrix: List[List[int]], total_bits: int):
+        self.algorithm = algorithm
+        self.target = target
+        self.bits = list(bits)
+        self.matrix = matrix
+        self.total_bits = total_bits
+        self.changed_bits = [sum(row) for row in matrix]
+        self.percentages = [changed / total_bits * 100 if total_bits else 0.0 for changed in self.changed_bits]
+
+    def summary(self) -> Dict[str, float]:
+        values = self.percentages
+        return {
+            "flipped_bits": len(values),
+            "mean": statistics.fmean(values) if values else 0.0,
+            "stddev": statistics.pstdev(values) if values else 0.0,
+            "min": min(values, default=0.0),
+            "max": max(values, default=0.0),
+        }
+
+    def to_csv(self, file_path: str) -> None:
+        """One row per flipped bit: bit index, changed bits, percentage, then the per-span counts."""
+        with open(file_path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            columns = len(self.matrix[0]) if self.matrix else 0
+            writer.writerow(["bit", "changed_bits", "percent"] + [f"span_{c}" for c in range(columns)])
+            for bit, changed, percent, row in zip(self.bits, self.changed_bits, self.percentages, self.matrix):
+                writer.writerow([bit, changed, f"{percent:.4f}"] + row)
+
+    def to_npz(self, file_path: str) -> None:
+        """Save the matrix, percentages and summary as a NumPy .npz archive."""
+        np = _numpy()
+        if np is None:
+            raise RuntimeError("Saving .npz files requires numpy")
+        summary = self.summary()
+        np.savez(file_path, bits=np.array(self.bits), matrix=np.array(self.matrix, dtype=np.int64),
+                 percentages=np.array(self.percentages), total_bits=self.total_bits,
+                 **{f"summary_{name}": value for name, value in summary.items()})
+
+
+# Sweep inputs installed once in each pool worker by _init_sweep_worker
+_sweep_state = None
+
+
+def _init_sweep_worker(algorithm: str, target: str, key: bytes, plaintext: bytes, baseline: bytes,
+                       columns: int) -> None:
+    global _sweep_state
+    incremental = IncrementalAvalanche(algorithm, key, plaintext, baseline) if target == "plaintext" else None
+    _sweep_state = (algorithm, target, key, plaintext, baseline, columns, incremental)
+
+
+def _sweep_bits(bits: Sequence[int]) -> List[List[int]]:
+    """Flip each bit in turn and compare against the baseline ciphertext.
+
+    Key flips re-encrypt everything; plaintext flips only re-encrypt what the flipped byte touches.
+    """
+    algorithm, target, key, plaintext, baseline, columns, incremental = _sweep_state
+    rows = []
+    for bit in bits:
+        if target == "key":
+            ciphertext = make_encryptor(algorithm, flip_bit(key, bit), len(plaintext))(plaintext)
+            rows.append(span_bit_differences(baseline, ciphertext, columns))
+        else:
+            position = bit // 8
+            flipped = plaintext[position] ^ (0x80 >> (bit % 8))
+            rows.append(incremental.span_differences([(position, flipped)], columns))
+    return rows
+
+
+def sweep(algorithm: str, key: bytes, plaintext: bytes, target: str = "key", bits: Optional[Sequence[int]] = None,
+          columns: int = 64, workers: Optional[int] = None) -> SweepResult:
+    """Flip every bit of the key or plaintext (or just `bits`) and measure the change against the baseline.
+
+    The re-encryptions are spread over a process pool of `workers` processes (None: one per CPU).
+    """
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Algorithm must be one of {', '.join(ALGORITHMS)}")
+    if target not in TARGETS:
+        raise ValueError(f"Target must be one of {', '.join(TARGETS)}")
+    source = key if target == "key" else plaintext
+    if bits is None:
+        bits = range(len(source) * 8)
+    bits = list(bits)
+    baseline = make_encryptor(algorithm, key, len(plaintext))(plaintext)
+    initargs = (algorithm, target, key, plaintext, baseline, columns)
+
+    tasks = [bits[i:i + BITS_PER_TASK] for i in range(0, len(bits), BITS_PER_TASK)]
+    workers = min((os.cpu_count() or 1) if workers is None else max(1, workers), len(tasks))
+    if workers <= 1:
+        _init_sweep_worker(*initargs)
+        rows = [row for task in tasks for row in _sweep_bits(task)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_sweep_worker, initargs=initargs) as pool:
+            rows = [row for result in pool.map(_sweep_bits, tasks) for row in result]
+    return SweepResult(algorithm, target, bits, rows, len(baseline) * 8)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Flip every key or plaintext bit and report the avalanche effect.")
+    parser.add_argument("--algorithm", choices=ALGORITHMS, default="aes")
+    parser.add_argument("--key", required=True, help="key as hex or text (AES keys must be 16, 24 or 32 bytes)")
+    parser.add_argument("--file", required=True, help="plaintext file")
+    parser.add_argument("--target", choices=TARGETS, default="key", help="which input to flip bits in")
+    parser.add_argument("--columns", type=int, default=64, help="ciphertext spans per matrix row")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--csv", help="write the per-bit matrix as CSV")
+    parser.add_argument("--npz", help="write the per-bit matrix and summary as .npz (requires numpy)")
+    args = parser.parse_args(argv)
+
+    key = AES._coerce_key(args.key)
+    with open(args.file, 'rb') as file:
+        plaintext = file.read()
+
+    result = sweep(args.algorithm, key, plaintext, args.target, columns=args.columns, workers=args.workers)
+    summary = result.summary()
+    print(f"{args.algorithm.upper()} {args.target} sweep over {summary['flipped_bits']} bits: "
+          f"mean {summary['mean']:.2f}%, stddev {summary['stddev']:.2f}%, "
+          f"min {summary['min']:.2f}%, max {summary['max']:.2f}%")
+    if args.csv:
+        result.to_csv(args.csv)
+        print(f"Per-bit matrix saved as {args.csv}")
+    if args.npz:
+        result.to_npz(args.npz)
+        print(f"Per-bit matrix saved as {args.npz}")
+
+
+if __name__ == "__main__":
+    main()
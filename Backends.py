@@ -0,0 +1,286 @@
+"""Registry of interchangeable AES and RC4 backends, picked per payload size by a one-time calibration.
+
+Usage:
+    python Backends.py              # show the backend chosen for each payload-size range
+    python Backends.py --calibrate  # re-measure and rewrite the cached choice
+
+    ciphertext = Backends.encrypt("aes", plaintext, key)       # backend chosen for len(plaintext)
+    cipher = Backends.new("rc4", key, backend="reference")     # or pin one by name
+
+Backends are registered with a loader that imports their module on first use, and availability is checked
+without importing anything, so a process only pays for the modules of the backends it actually runs (NumPy
+is never loaded by a process that only handles small payloads). The calibration times every available
+backend once per size range and stores the fastest in a JSON file; later processes just read that file.
+"""
+import argparse
+import bisect
+import importlib.util
+import json
+import os
+import platform
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+CIPHERS = ("aes", "rc4")
+
+# Upper bounds (bytes) of the payload-size ranges a backend is chosen for; the last range is open-ended
+SIZE_RANGES = [256, 4 * 1024, 64 * 1024]
+
+# Payload timed for each size range during calibration
+CALIBRATION_SIZES = [64, 1024, 16 * 1024, 128 * 1024]
+
+# A backend this many times slower than the best in one range is not timed in the larger ranges
+CALIBRATION_CUTOFF = 4.0
+
+# Calibration results are cached here, per Python version, machine and set of available backends,
+# unless the CIPHER_BACKEND_CACHE environment variable names another file
+BACKEND_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "cipher_backends.json")
+
+# Used when calibration is unavailable (e.g. the cache directory is read-only)
+DEFAULT_BACKENDS = {"aes": "ttable", "rc4": "stream"}
+
+
+class Backend:
+    """One implementation of a cipher: load() imports it and returns a factory key -> object with encrypt/decrypt."""
+
+    def __init__(self, cipher: str, name: str, load: Callable[[], Callable], requires: Sequence[str] = ()):
+        self.cipher = cipher
+        self.name = name
+        self.requires = tuple(requires)
+        self._load = load
+        self._factory = None
+
+    def available(self) -> bool:
+        """Whether the optional modules it needs are installed (checked without importing them)."""
+        return all(importlib.util.find_spec(module) is not None for module in self.requires)
+
+    def new(self, key: Union[bytes, str]):
+        if self._factory is None:
+            self._factory = self._load()
+        return self._factory(key)
+
+
+_registry: Dict[str, Dict[str, Backend]] = {cipher: {} for cipher in CIPHERS}
+
+# Backend name per size range and cipher, once read from the cache or calibrated
+_selection: Optional[Dict[str, List[str]]] = None
+
+
+def register(cipher: str, name: str, load: Callable[[], Callable], requires: Sequence[str] = ()) -> Backend:
+    """Add (or replace) a backend; load is called once, on first use, and returns a key -> cipher factory."""
+    if cipher not in CIPHERS:
+        raise ValueError(f"Cipher must be one of {', '.join(CIPHERS)}")
+    backend = Backend(cipher, name, load, requires)
+    _registry[cipher][name] = backend
+    return backend
+
+
+def backends(cipher: str, available_only: bool = True) -> List[str]:
+    return [name for name, backend in _registry[cipher].items() if not available_only or backend.available()]
+
+
+def _aes_engine(engine: str) -> Callable[[], Callable]:
+    def load():
+        from AES import AES
+        return lambda key: AES.new(key, engine=engine)
+    return load
+
+
+def _batch_aes():
+    from AESBatch import BatchAES
+    return BatchAES
+
+
+class _RC4Reference:
+    """rc4_encrypt: list-based KSA and PRGA on every call."""
+
+    def __init__(self, key: Union[bytes, str]):
+        self.key = key.encode('utf-8') if isinstance(key, str) else key
+
+    def encrypt(self, data: bytes) -> bytes:
+        import RC4
+        return RC4.rc4_encrypt(data, self.key)
+
+    decrypt = encrypt
+
+
+class _RC4Stream:
+    """RC4 object keyed once; each message starts from a copy of the keyed state."""
+
+    def __init__(self, key: Union[bytes, str]):
+        from RC4 import RC4
+        self.cipher = RC4(key.encode('utf-8') if isinstance(key, str) else key)
+
+    def encrypt(self, data: bytes) -> bytes:
+        return self.cipher.copy().update(data)
+
+    decrypt = encrypt
+
+
+register("aes", "reference", _aes_engine("reference"))
+register("aes", "ttable", _aes_engine("ttable"))
+register("aes", "compact", _aes_engine("compact"))
+register("aes", "numpy", _batch_aes, requires=("numpy",))
+register("rc4", "reference", lambda: _RC4Reference)
+register("rc4", "stream", lambda: _RC4Stream)
+
+
+def cache_path() -> str:
+    """Calibration cache file, looked up on every call so later changes to the environment take effect."""
+    return os.environ.get("CIPHER_BACKEND_CACHE") or BACKEND_CACHE_PATH
+
+
+def _fingerprint() -> str:
+    """Calibration results are only valid for the same interpreter, machine and set of backends."""
+    names = ",".join(f"{cipher}:{name}" for cipher in CIPHERS for name in backends(cipher))
+    return f"{platform.python_implementation()}-{platform.python_version()}-{platform.machine()}-{names}"
+
+
+def _time_backend(backend: Backend, size: int, time_budget: float) -> float:
+    """Best seconds for an encrypt + decrypt round trip of size bytes."""
+    cipher = backend.new(os.urandom(16))
+    data = os.urandom(size)
+    best = float("inf")
+    spent = 0.0
+    while spent < time_budget or best == float("inf"):
+        start = time.perf_counter()
+        cipher.decrypt(cipher.encrypt(data))
+        elapsed = time.perf_counter() - start
+        best = min(best, elapsed)
+        spent += elapsed
+    return best
+
+
+def calibrate(path: Optional[str] = None, time_budget: float = 0.05, progress=None, save: bool = True) -> Dict:
+    """Time every available backend on each calibration size, pick the fastest per range and cache the result.
+
+    path defaults to cache_path(); with save=False nothing is written.
+    """
+    global _selection
+    selection = {}
+    timings = {}
+    for cipher in CIPHERS:
+        candidates = backends(cipher)
+        selection[cipher] = []
+        timings[cipher] = []
+        for size in CALIBRATION_SIZES:
+            seconds = {name: _time_backend(_registry[cipher][name], size, time_budget) for name in candidates}
+            fastest = min(seconds, key=seconds.get)
+            selection[cipher].append(fastest)
+            timings[cipher].append({name: size / elapsed / 1e6 for name, elapsed in seconds.items()})
+            if progress:
+                progress(f"{cipher} {size:>7} B: {fastest} "
+                         + "  ".join(f"{name} {size / elapsed / 1e6:.3f} MB/s" for name, elapsed in seconds.items()))
+            candidates = [name for name in candidates if seconds[name] <= seconds[fastest] * CALIBRATION_CUTOFF]
+
+    report = {"fingerprint": _fingerprint(), "size_ranges": SIZE_RANGES, "selection": selection,
+              "mb_per_s": timings}
+    if save:
+        path = path or cache_path()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        os.replace(temp_path, path)
+    _selection = selection
+    return report
+
+
+def _load_selection(path: Optional[str]) -> Optional[Dict[str, List[str]]]:
+    """Cached selection, if it exists and was made for this interpreter, machine and backend set."""
+    try:
+        with open(path, encoding="utf-8") as file:
+            report = json.load(file)
+    except (OSError, TypeError, ValueError):
+        return None
+    if report.get("fingerprint") != _fingerprint() or report.get("size_ranges") != SIZE_RANGES:
+        return None
+    return report["selection"]
+
+
+def selection(path: Optional[str] = None) -> Dict[str, List[str]]:
+    """Backend per size range for each cipher: read from the cache, calibrating once when it is missing or stale.
+
+    path defaults to cache_path().
+    """
+    global _selection
+    path = path or cache_path()
+    if _selection is None:
+        _selection = _load_selection(path)
+    if _selection is None:
+        try:
+            calibrate(path)
+        except OSError:  # cache not writable: measure anyway, just without saving
+            calibrate(save=False)
+    return _selection
+
+
+def set_selection(chosen: Optional[Dict[str, List[str]]]) -> None:
+    """Use chosen (backend per size range for each cipher) instead of the cache; None reads the cache again.
+
+    Lets a parent process hand its resolved selection to workers, and tests pin backends without calibrating.
+    """
+    global _selection
+    if chosen is not None:
+        for cipher in CIPHERS:
+            names = chosen.get(cipher, [])
+            if len(names) != len(SIZE_RANGES) + 1 or any(name not in _registry[cipher] for name in names):
+                raise ValueError(f"Selection for {cipher} must name {len(SIZE_RANGES) + 1} registered backends")
+        chosen = {cipher: list(chosen[cipher]) for cipher in CIPHERS}
+    _selection = chosen
+
+
+def choose(cipher: str, size: Optional[int] = None) -> str:
+    """Name of the backend to use for a payload of size bytes (None: the largest range)."""
+    if cipher not in CIPHERS:
+        raise ValueError(f"Cipher must be one of {', '.join(CIPHERS)}")
+    chosen = selection()[cipher]
+    return chosen[-1] if size is None else chosen[bisect.bisect_left(SIZE_RANGES, size)]
+
+
+def new(cipher: str, key: Union[bytes, str], size_hint: Optional[int] = None, backend: Optional[str] = None):
+    """Keyed cipher object with encrypt(data) and decrypt(data) from the named or best-calibrated backend.
+
+    AES backends use ECB with PKCS#7 padding (the same output as AES.encrypt); RC4 backends start every
+    message from the beginning of the keystream (the same output as rc4_encrypt).
+    """
+    if cipher not in CIPHERS:
+        raise ValueError(f"Cipher must be one of {', '.join(CIPHERS)}")
+    name = backend or choose(cipher, size_hint)
+    if name not in _registry[cipher]:
+        raise ValueError(f"Unknown {cipher} backend {name!r}; registered: {', '.join(_registry[cipher])}")
+    return _registry[cipher][name].new(key)
+
+
+def encrypt(cipher: str, data: bytes, key: Union[bytes, str], backend: Optional[str] = None) -> bytes:
+    return new(cipher, key, len(data), backend).encrypt(data)
+
+
+def decrypt(cipher: str, data: bytes, key: Union[bytes, str], backend: Optional[str] = None) -> bytes:
+    return new(cipher, key, len(data), backend).decrypt(data)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Show or recalibrate the AES/RC4 backend selection.")
+    parser.add_argument("--calibrate", action="store_true", help="re-measure even if a cached result exists")
+    parser.add_argument("--cache", help="calibration cache file (default: $CIPHER_BACKEND_CACHE or "
+                                        "~/.cache/cipher_backends.json)")
+    parser.add_argument("--time-budget", type=float, default=0.05, help="seconds spent timing each backend per size")
+    args = parser.parse_args(argv)
+    args.cache = args.cache or cache_path()
+
+    if args.calibrate or _load_selection(args.cache) is None:
+        calibrate(args.cache, args.time_budget, progress=print)
+        print(f"Calibration saved as {args.cache}")
+    chosen = selection(args.cache)
+    bounds = [f"<= {size}" for size in SIZE_RANGES] + [f"> {SIZE_RANGES[-1]}"]
+    for cipher in CIPHERS:
+        print(f"{cipher}: available {', '.join(backends(cipher))}")
+        for bound, name in zip(bounds, chosen[cipher]):
+            print(f"  {bound:>10} B  {name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""RC4 -> AES cascade as a two-stage pipeline.
+
+Encryption runs RC4 over the plaintext and then AES-ECB (PKCS#7-padded) over the RC4 output, so the result is
+identical to `AES.encrypt(rc4_encrypt(plaintext, rc4_key), aes_key)`; decryption runs the stages in reverse.
+Large payloads are cut into chunks and the first stage runs in a separate process (or thread), handing its
+output to the second stage through a bounded queue, so the two passes overlap instead of running back to back.
+"""
+import multiprocessing
+import queue
+import threading
+from typing import BinaryIO, Callable, Iterable, Union
+
+from AES import AES, STREAM_CHUNK_SIZE
+from RC4 import RC4
+
+# Chunks buffered between two stages; bounds memory when one stage outruns the other
+QUEUE_DEPTH = 4
+
+# Payloads below this run both stages inline: starting a worker costs more than the overlap saves
+MIN_PIPELINE_SIZE = 256 * 1024
+
+
+class _RC4Stage:
+    """RC4 keystream XOR carried across chunks."""
+
+    def __init__(self, key: bytes):
+        self.cipher = RC4(key)
+
+    def update(self, data: bytes) -> bytes:
+        return self.cipher.update(data)
+
+    def finalize(self) -> bytes:
+        return b''
+
+
+class _AESEncryptStage:
+    """AES-ECB over whole blocks as they arrive; the remainder is padded at the end."""
+
+    def __init__(self, context):
+        self.aes = context.aes
+        self.schedule = context.schedule
+        self.pending = b''
+
+    def update(self, data: bytes) -> bytes:
+        data = self.pending + data if self.pending else data
+        ready = len(data) - len(data) % 16
+        self.pending = data[ready:]
+        return self.aes._ecb_encrypt_blocks(self.schedule, data[:ready])
+
+    def finalize(self) -> bytes:
+        return self.aes._ecb_encrypt_blocks(self.schedule, self.aes._pad_pkcs7(self.pending))
+
+
+class _AESDecryptStage:
+    """AES-ECB decryption that holds back the final block until the end so it can be unpadded."""
+
+    def __init__(self, context):
+        self.aes = context.aes
+        self.schedule = context.schedule
+        self.pending = b''
+
+    def update(self, data: bytes) -> bytes:
+        data = self.pending + data if self.pending else data
+        ready = max(0, (len(data) - 1) // 16 * 16)
+        self.pending = data[ready:]
+        return self.aes._ecb_decrypt_blocks(self.schedule, data[:ready])
+
+    def finalize(self) -> bytes:
+        if len(self.pending) != 16:
+            raise ValueError("Ciphertext length must be a non-zero multiple of 16 bytes")
+        return self.aes._unpad_pkcs7(self.aes._ecb_decrypt_blocks(self.schedule, self.pending))
+
+
+def _stage_worker(stage, inbox, outbox) -> None:
+    """Run stage over chunks from inbox until None, forwarding its output (or the error) to outbox."""
+    try:
+        for chunk in iter(inbox.get, None):
+            outbox.put(stage.update(chunk))
+        outbox.put(stage.finalize())
+        outbox.put(None)
+    except Exception as e:
+        outbox.put(e)
+
+
+class CascadeCipher:
+    """RC4 -> AES cascade bound to its two keys; AES may use 128, 192 or 256-bit keys.
+
+    With processes=True (the default) the first stage of a pipelined run is a child process, so the RC4 and
+    AES passes execute in parallel; processes=False uses a thread, which overlaps I/O but shares the GIL.
+    """
+
+    def __init__(self, rc4_key: Union[bytes, str], aes_key: Union[bytes, str], engine: str = "ttable",
+                 chunk_size: int = STREAM_CHUNK_SIZE, queue_depth: int = QUEUE_DEPTH, processes: bool = True):
+        self.rc4_key = AES._coerce_key(rc4_key)
+        self.aes = AES.new(aes_key, engine=engine)
+        self.chunk_size = max(16, chunk_size - chunk_size % 16)
+        self.queue_depth = queue_depth
+        self.processes = processes
+
+    @property
+    def aes_key_size(self) -> int:
+        return self.aes.key_size
+
+    def _run(self, chunks: Iterable[bytes], first, second, write: Callable[[bytes], object],
+             pipelined: bool) -> None:
+        """Push chunks through first then second, writing second's output."""
+        if not pipelined:
+            for chunk in chunks:
+                write(second.update(first.update(chunk)))
+            write(second.update(first.finalize()))
+            write(second.finalize())
+            return
+
+        if self.processes:
+            context = multiprocessing.get_context()
+            inbox, outbox = context.Queue(self.queue_depth), context.Queue(self.queue_depth)
+            worker = context.Process(target=_stage_worker, args=(first, inbox, outbox), daemon=True)
+        else:
+            inbox, outbox = queue.Queue(self.queue_depth), queue.Queue(self.queue_depth)
+            worker = threading.Thread(target=_stage_worker, args=(first, inbox, outbox), daemon=True)
+        feed_error = []
+
+        def feed() -> None:
+            try:
+                for chunk in chunks:
+                    inbox.put(chunk)
+            except Exception as e:
+                feed_error.append(e)
+            inbox.put(None)
+
+        worker.start()
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        try:
+            for chunk in iter(outbox.get, None):
+                if isinstance(chunk, Exception):
+                    raise chunk
+                write(second.update(chunk))
+            feeder.join()
+            if feed_error:
+                raise feed_error[0]
+            write(second.finalize())
+            worker.join()
+        finally:
+            # On error the worker may be blocked on a full queue: a process is killed, a daemon thread abandoned
+            if self.processes and worker.is_alive():
+                worker.terminate()
+                worker.join()
+
+    def _chunks(self, data: bytes) -> Iterable[bytes]:
+        view = memoryview(data)
+        return (bytes(view[i:i + self.chunk_size]) for i in range(0, len(data), self.chunk_size))
+
+    def encrypt(self, plaintext: Union[bytes, str]) -> bytes:
+        """RC4 then AES-ECB with PKCS#7 padding."""
+        if isinstance(plaintext, str):
+            plaintext = plaintext.encode('utf-8')
+        out = []
+        self._run(self._chunks(plaintext), _RC4Stage(self.rc4_key), _AESEncryptStage(self.aes), out.append,
+                  pipelined=len(plaintext) >= MIN_PIPELINE_SIZE)
+        return b''.join(out)
+
+    def decrypt(self, ciphertext: bytes) -> bytes:
+        """AES-ECB decryption and unpadding, then RC4."""
+        out = []
+        self._run(self._chunks(ciphertext), _AESDecryptStage(self.aes), _RC4Stage(self.rc4_key), out.append,
+                  pipelined=len(ciphertext) >= MIN_PIPELINE_SIZE)
+        return b''.join(out)
+
+    def encrypt_stream(self, src: BinaryIO, dst: BinaryIO, pipelined: bool = True) -> None:
+        """Encrypt src into dst chunk by chunk; memory use is bounded by the queue depth."""
+        chunks = iter(lambda: src.read(self.chunk_size), b'')
+        self._run(chunks, _RC4Stage(self.rc4_key), _AESEncryptStage(self.aes), dst.write, pipelined)
+
+    def decrypt_stream(self, src: BinaryIO, dst: BinaryIO, pipelined: bool = True) -> None:
+        """Decrypt src into dst chunk by chunk."""
+        chunks = iter(lambda: src.read(self.chunk_size), b'')
+        self._run(chunks, _AESDecryptStage(self.aes), _RC4Stage(self.rc4_key), dst.write, pipelined)
@@ -0,0 +1,522 @@
+"""Local asyncio encryption service for AES and RC4, with request coalescing and a load generator.
+
+Usage:
+    python CipherService.py serve --port 8765
+    python CipherService.py serve --unix /tmp/cipher.sock
+    python CipherService.py loadgen --port 8765 --connections 32 --requests 5000 --size 256
+
+Frames on the wire are a 4-byte big-endian header length, a JSON header, then `header["length"]` payload bytes.
+Requests carry {"id", "op": "encrypt" | "decrypt" | "stats", "algorithm": "aes" | "rc4", "key" (hex),
+"mode": "ecb" | "ctr" (AES), "iv" (hex, CTR nonce)}; responses carry {"id", "ok", "error", "latency_ms"}.
+Concurrent requests that share algorithm, operation, mode and key are coalesced into one batched cipher call
+that runs in an executor and expands the key schedule once, on the backend Backends.py calibrated as fastest
+for the size the cipher actually runs on (a whole AES-ECB batch, or one RC4/CTR message).
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import os
+import struct
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import Backends
+
+FRAME_LENGTH = struct.Struct(">I")
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = [0.125 * 2 ** i for i in range(18)]
+
+# Key contexts kept per executor process, so a key's schedule is reused across batches
+CONTEXT_CACHE_SIZE = 256
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Exact pct-th percentile (nearest rank) of raw samples, as in benchmark.py."""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class LatencyHistogram:
+    """Log-scale latency histogram with approximate percentiles, for the server's running stats."""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, latency_ms: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+        self.total += 1
+        self.sum_ms += latency_ms
+        self.max_ms = max(self.max_ms, latency_ms)
+
+    def percentile(self, pct: float) -> float:
+        """Upper bound of the bucket holding the pct-th percentile."""
+        if not self.total:
+            return 0.0
+        threshold = pct / 100 * self.total
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= threshold:
+                return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.total,
+            "mean_ms": self.sum_ms / self.total if self.total else 0.0,
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p99_ms": self.percentile(99),
+            "max_ms": self.max_ms,
+            "buckets_ms": LATENCY_BUCKETS_MS,
+            "counts": self.counts,
+        }
+
+
+# Cipher objects for recently used keys and backends, per executor process; the lock serializes the
+# lookups and evictions of executor threads (serve --threads)
+_contexts: "OrderedDict[Tuple[str, str, bytes], object]" = OrderedDict()
+_contexts_lock = threading.Lock()
+
+
+def _cipher_for(algorithm: str, key: bytes, size_hint: Optional[int] = None):
+    """Cached keyed cipher from the backend calibrated for size_hint bytes (AES contexts keep their schedule)."""
+    backend = Backends.choose(algorithm, size_hint)
+    cache_key = (algorithm, backend, key)
+    with _contexts_lock:
+        cipher = _contexts.get(cache_key)
+        if cipher is not None:
+            _contexts.move_to_end(cache_key)
+            return cipher
+
+    cipher = Backends.new(algorithm, key, backend=backend)
+    with _contexts_lock:
+        _contexts[cache_key] = cipher
+        _contexts.move_to_end(cache_key)
+        while len(_contexts) > CONTEXT_CACHE_SIZE:
+            _contexts.popitem(last=False)
+    return cipher
+
+
+def _aes_ecb_batch(cipher, op: str, payloads: List[bytes]) -> List[Tuple[bool, bytes]]:
+    """Encrypt or decrypt several ECB messages with one pass over their concatenated blocks."""
+    aes = cipher.aes
+    if op == "encrypt":
+        padded = [aes._pad_pkcs7(payload) for payload in payloads]
+    else:
+        padded = list(payloads)
+        for payload in padded:
+            if not payload or len(payload) % 16 != 0:
+                raise ValueError("Ciphertext length must be a non-zero multiple of 16 bytes")
+    joined = b''.join(padded)
+    if hasattr(cipher, "encrypt_blocks"):  # the NumPy backend (BatchAES) works on block arrays
+        blocks = cipher.to_blocks(joined)
+        output = (cipher.encrypt_blocks(blocks) if op == "encrypt" else cipher.decrypt_blocks(blocks)).tobytes()
+    elif op == "encrypt":
+        output = aes._ecb_encrypt_blocks(cipher.schedule, joined)
+    else:
+        output = aes._ecb_decrypt_blocks(cipher.schedule, joined)
+
+    results = []
+    offset = 0
+    for piece in padded:
+        message = output[offset:offset + len(piece)]
+        offset += len(piece)
+        if op == "encrypt":
+            results.append((True, message))
+            continue
+        try:
+            results.append((True, aes._unpad_pkcs7(message)))
+        except ValueError as e:
+            results.append((False, str(e).encode('utf-8')))
+    return results
+
+
+def process_batch(algorithm: str, op: str, mode: str, key: bytes,
+                  items: List[Tuple[bytes, Optional[bytes]]]) -> List[Tuple[bool, bytes]]:
+    """Run one coalesced batch of (payload, iv) items sharing a key; returns (ok, result or error) per item.
+
+    An ECB batch runs as one pass over all its blocks, so its backend is chosen for the batch's total size;
+    RC4 and CTR items (and ECB items retried alone) run one at a time, each on the backend for its own size.
+    """
+    if algorithm == "aes" and mode == "ecb":
+        cipher = _cipher_for(algorithm, key, sum(len(payload) for payload, _ in items))
+        try:
+            return _aes_ecb_batch(cipher, op, [payload for payload, _ in items])
+        except ValueError:
+            pass  # a malformed message in the batch: fall back to per-item processing for precise errors
+    results = []
+    for payload, iv in items:
+        cipher = _cipher_for(algorithm, key, len(payload))
+        try:
+            if algorithm == "rc4":
+                results.append((True, cipher.encrypt(payload)))
+            elif mode == "ctr":
+                results.append((True, cipher.encrypt_ctr(payload, iv)))
+            else:
+                results.append(_aes_ecb_batch(cipher, op, [payload])[0])
+        except ValueError as e:
+            results.append((False, str(e).encode('utf-8')))
+    return results
+
+
+class BatchCoalescer:
+    """Groups concurrent requests with the same batch key and runs each group as one executor call."""
+
+    def __init__(self, executor: Executor, max_batch: int = 64, max_delay: float = 0.002):
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.batches = 0
+        self.batched_items = 0
+        self._pending: Dict[Tuple, List[Tuple[Tuple[bytes, Optional[bytes]], asyncio.Future]]] = {}
+        self._timers: Dict[Tuple, asyncio.TimerHandle] = {}
+
+    async def submit(self, batch_key: Tuple, item: Tuple[bytes, Optional[bytes]]) -> Tuple[bool, bytes]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(batch_key, [])
+        pending.append((item, future))
+        if len(pending) >= self.max_batch:
+            self._flush(batch_key)
+        elif len(pending) == 1:
+            self._timers[batch_key] = loop.call_later(self.max_delay, self._flush, batch_key)
+        return await future
+
+    def _flush(self, batch_key: Tuple) -> None:
+        # A batch flushed because it filled up must not leave its timer to flush the next batch early
+        timer = self._timers.pop(batch_key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(batch_key, None)
+        if not batch:
+            return
+        self.batches += 1
+        self.batched_items += len(batch)
+        loop = asyncio.get_running_loop()
+        work = loop.run_in_executor(self.executor, process_batch, *batch_key, [item for item, _ in batch])
+
+        def deliver(done: asyncio.Future) -> None:
+            error = done.exception()
+            for index, (_, future) in enumerate(batch):
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(done.result()[index])
+
+        work.add_done_callback(deliver)
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Optional[Tuple[Dict, bytes]]:
+    """Read one (header, payload) frame, or None at EOF."""
+    try:
+        (header_length,) = FRAME_LENGTH.unpack(await reader.readexactly(FRAME_LENGTH.size))
+        header = json.loads(await reader.readexactly(header_length))
+        if not isinstance(header, dict):
+            raise ValueError("Frame header must be a JSON object")
+        length = header.get("length", 0)
+        if not isinstance(length, int) or length < 0:
+            raise ValueError("Frame length must be a non-negative integer")
+        payload = await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        return None
+    return header, payload
+
+
+def write_frame(writer: asyncio.StreamWriter, header: Dict, payload: bytes = b'') -> None:
+    header = dict(header, length=len(payload))
+    encoded = json.dumps(header).encode('utf-8')
+    writer.write(FRAME_LENGTH.pack(len(encoded)) + encoded + payload)
+
+
+class CipherService:
+    """asyncio server: reads framed requests, coalesces them into batches and applies backpressure.
+
+    At most max_pending requests are in flight; beyond that the server stops reading from its sockets
+    until work completes, so clients are slowed by TCP flow control instead of growing server memory.
+    """
+
+    def __init__(self, executor: Executor, max_pending: int = 1024, max_batch: int = 64, max_delay: float = 0.002):
+        self.coalescer = BatchCoalescer(executor, max_batch, max_delay)
+        self.max_pending = max_pending
+        self.latency: Dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def stats(self) -> Dict:
+        coalescer = self.coalescer
+        return {
+            "latency": {name: histogram.to_dict() for name, histogram in self.latency.items()},
+            "batches": coalescer.batches,
+            "mean_batch_size": coalescer.batched_items / coalescer.batches if coalescer.batches else 0.0,
+        }
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        tasks = set()
+        try:
+            while True:
+                await self._slots.acquire()  # backpressure: stop reading while the server is saturated
+                handed_off = False
+                try:
+                    frame = await read_frame(reader)
+                    if frame is None:
+                        break
+                    task = asyncio.create_task(self._handle_request(writer, *frame))
+                    handed_off = True  # _handle_request releases the slot
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                except (ValueError, AttributeError) as e:
+                    # The stream can no longer be split into frames: report it and drop the connection
+                    write_frame(writer, {"id": None, "ok": False, "error": f"Malformed frame: {e}"})
+                    break
+                except ConnectionError:
+                    break
+                finally:
+                    if not handed_off:
+                        self._slots.release()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            try:
+                await writer.drain()
+            except ConnectionError:
+                pass
+            writer.close()
+
+    async def _handle_request(self, writer: asyncio.StreamWriter, header: Dict, payload: bytes) -> None:
+        start = time.perf_counter()
+        request_id = header.get("id")
+        body = b''
+        try:
+            if header.get("op") == "stats":
+                response = {"id": request_id, "ok": True}
+                body = json.dumps(self.stats()).encode('utf-8')
+            else:
+                batch_key, iv = self._parse(header)
+                ok, result = await self.coalescer.submit(batch_key, (payload, iv))
+                latency_ms = (time.perf_counter() - start) * 1e3
+                self.latency[f"{batch_key[0]}.{batch_key[1]}"].record(latency_ms)
+                if ok:
+                    response = {"id": request_id, "ok": True, "latency_ms": latency_ms}
+                    body = result
+                else:
+                    response = {"id": request_id, "ok": False, "error": result.decode('utf-8')}
+        except (ValueError, KeyError) as e:
+            response = {"id": request_id, "ok": False, "error": str(e)}
+        except Exception as e:  # bad field types, a broken pool...: the client still gets an answer for its id
+            response = {"id": request_id, "ok": False, "error": f"{type(e).__name__}: {e}"}
+        try:
+            write_frame(writer, response, body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    def _parse(header: Dict) -> Tuple[Tuple[str, str, str, bytes], Optional[bytes]]:
+        """Validate a request header and return its batch key and IV."""
+        op, algorithm = header["op"], header["algorithm"]
+        if op not in ("encrypt", "decrypt"):
+            raise ValueError("op must be encrypt, decrypt or stats")
+        key = bytes.fromhex(header["key"])
+        if algorithm == "rc4":
+            return (algorithm, "encrypt", "stream", key), None
+        if algorithm != "aes":
+            raise ValueError("algorithm must be aes or rc4")
+        if len(key) * 8 not in (128, 192, 256):
+            raise ValueError("AES keys must be 128, 192 or 256 bits")
+        mode = header.get("mode", "ecb")
+        if mode == "ctr":
+            iv = bytes.fromhex(header.get("iv", ""))
+            if len(iv) != 16:
+                raise ValueError("Nonce must be 16 bytes")
+            # CTR encryption and decryption are the same operation, so they share batches
+            return (algorithm, "encrypt", mode, key), iv
+        if mode != "ecb":
+            raise ValueError("AES mode must be ecb or ctr")
+        return (algorithm, op, mode, key), None
+
+
+class CipherClient:
+    """asyncio client; requests on one connection are pipelined and matched to responses by id."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self._next_id = 0
+        self._waiting: Dict[int, asyncio.Future] = {}
+        self._reader_task = asyncio.create_task(self._read_responses())
+
+    @classmethod
+    async def connect(cls, host: str = "127.0.0.1", port: int = 8765, unix_path: Optional[str] = None):
+        if unix_path:
+            reader, writer = await asyncio.open_unix_connection(unix_path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def _read_responses(self) -> None:
+        while True:
+            frame = await read_frame(self.reader)
+            if frame is None:
+                break
+            header, payload = frame
+            future = self._waiting.pop(header.get("id"), None)
+            if future is not None and not future.done():
+                future.set_result((header, payload))
+        for future in self._waiting.values():
+            if not future.done():
+                future.set_exception(ConnectionError("Connection closed"))
+
+    async def request(self, op: str, algorithm: str = "aes", key: bytes = b'', data: bytes = b'',
+                      mode: str = "ecb", iv: Optional[bytes] = None) -> bytes:
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[request_id] = future
+        header = {"id": request_id, "op": op, "algorithm": algorithm, "key": key.hex(), "mode": mode}
+        if iv is not None:
+            header["iv"] = iv.hex()
+        write_frame(self.writer, header, data)
+        await self.writer.drain()
+        response, payload = await future
+        if not response.get("ok"):
+            raise ValueError(response.get("error", "request failed"))
+        return payload
+
+    async def encrypt(self, algorithm: str, key: bytes, data: bytes, **options) -> bytes:
+        return await self.request("encrypt", algorithm, key, data, **options)
+
+    async def decrypt(self, algorithm: str, key: bytes, data: bytes, **options) -> bytes:
+        return await self.request("decrypt", algorithm, key, data, **options)
+
+    async def stats(self) -> Dict:
+        return json.loads(await self.request("stats"))
+
+    async def close(self) -> None:
+        self.writer.close()
+        await self.writer.wait_closed()
+        self._reader_task.cancel()
+
+
+async def serve(args) -> None:
+    # Calibrate (or read the cached calibration) once here and hand the result to every worker process, so none
+    # of them calibrates again, even when the cache could not be written
+    chosen = Backends.selection()
+    if args.threads:
+        executor = ThreadPoolExecutor(args.workers)
+    else:
+        executor = ProcessPoolExecutor(args.workers, initializer=Backends.set_selection, initargs=(chosen,))
+    service = CipherService(executor, args.max_pending, args.max_batch, args.batch_delay_ms / 1e3)
+    if args.unix:
+        server = await asyncio.start_unix_server(service.handle_connection, path=args.unix)
+        where = args.unix
+    else:
+        server = await asyncio.start_server(service.handle_connection, args.host, args.port)
+        where = f"{args.host}:{args.port}"
+    print(f"Cipher service listening on {where}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+async def loadgen(args) -> Dict:
+    """Drive the service from many connections and report latency percentiles and requests/s."""
+    keys = [os.urandom(args.key_size // 8) for _ in range(args.keys)]
+    payload = os.urandom(args.size)
+    latencies_ms: List[float] = []
+    remaining = args.requests
+    failures = 0
+
+    async def connection_worker(client: CipherClient, index: int) -> None:
+        nonlocal remaining, failures
+        count = 0
+        while remaining > 0:
+            remaining -= 1
+            key = keys[(index + count) % len(keys)]
+            count += 1
+            start = time.perf_counter()
+            try:
+                if args.algorithm == "rc4":
+                    await client.encrypt("rc4", key, payload)
+                else:
+                    await client.encrypt("aes", key, payload, mode=args.mode,
+                                         iv=os.urandom(16) if args.mode == "ctr" else None)
+            except ValueError:
+                failures += 1
+            latencies_ms.append((time.perf_counter() - start) * 1e3)
+
+    clients = [await CipherClient.connect(args.host, args.port, args.unix) for _ in range(args.connections)]
+    start = time.perf_counter()
+    await asyncio.gather(*(connection_worker(client, i) for i, client in enumerate(clients)))
+    elapsed = time.perf_counter() - start
+    server_stats = await clients[0].stats()
+    for client in clients:
+        await client.close()
+
+    report = {
+        "requests": len(latencies_ms),
+        "failures": failures,
+        "seconds": elapsed,
+        "requests_per_s": len(latencies_ms) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies_ms, 50) if latencies_ms else 0.0,
+        "p99_ms": percentile(latencies_ms, 99) if latencies_ms else 0.0,
+        "max_ms": max(latencies_ms, default=0.0),
+        "server_mean_batch_size": server_stats["mean_batch_size"],
+    }
+    print(f"{report['requests']} requests ({failures} failed) in {elapsed:.2f}s: "
+          f"{report['requests_per_s']:.1f} req/s, p50 {report['p50_ms']:.3f} ms, p99 {report['p99_ms']:.3f} ms, "
+          f"mean server batch {report['server_mean_batch_size']:.1f}")
+    return report
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Local AES/RC4 encryption service and load generator.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name in ("serve", "loadgen"):
+        command = commands.add_parser(name)
+        command.add_argument("--host", default="127.0.0.1")
+        command.add_argument("--port", type=int, default=8765)
+        command.add_argument("--unix", help="Unix socket path instead of TCP")
+
+    serve_parser = commands.choices["serve"]
+    serve_parser.add_argument("--workers", type=int, default=os.cpu_count(), help="executor workers")
+    serve_parser.add_argument("--threads", action="store_true", help="use a thread pool instead of processes")
+    serve_parser.add_argument("--max-pending", type=int, default=1024, help="requests in flight before backpressure")
+    serve_parser.add_argument("--max-batch", type=int, default=64, help="largest coalesced batch")
+    serve_parser.add_argument("--batch-delay-ms", type=float, default=2.0, help="how long a batch waits to fill")
+
+    loadgen_parser = commands.choices["loadgen"]
+    loadgen_parser.add_argument("--connections", type=int, default=16)
+    loadgen_parser.add_argument("--requests", type=int, default=2000)
+    loadgen_parser.add_argument("--size", type=int, default=256, help="payload bytes per request")
+    loadgen_parser.add_argument("--algorithm", choices=("aes", "rc4"), default="aes")
+    loadgen_parser.add_argument("--mode", choices=("ecb", "ctr"), default="ecb")
+    loadgen_parser.add_argument("--key-size", type=int, choices=(128, 192, 256), default=128)
+    loadgen_parser.add_argument("--keys", type=int, default=4, help="distinct keys shared by the requests")
+
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args) if args.command == "serve" else loadgen(args))
+    except KeyboardInterrupt:
+        sys.exit(130)
+
+
+if __name__ == "__main__":
+    main()
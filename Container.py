@@ -0,0 +1,294 @@
+"""Seekable encrypted container: a header, independently encrypted fixed-size chunks, and a chunk index.
+
+Layout (all integers big-endian):
+
+    header   magic "RCAE", version, algorithm, key size in bits, mode, chunk size, plaintext length,
+             chunk count, index offset, 16-byte nonce
+    chunks   chunk i holds plaintext bytes [i * chunk_size, (i + 1) * chunk_size), encrypted on its own
+    index    (offset, length) of every chunk
+
+AES chunks use CTR (counter blocks continue from chunk to chunk, so any block can be decrypted alone) or
+CBC (each chunk padded, with IV = AES_k(nonce + i)). RC4 chunks use a per-chunk key derived from the key,
+nonce and chunk number, with the first RC4_DROP keystream bytes discarded.
+"""
+import hashlib
+import mmap
+import os
+import struct
+from typing import BinaryIO, List, Optional, Tuple, Union
+
+from AES import AES, ENGINES
+from RC4 import RC4
+
+MAGIC = b"RCAE"
+VERSION = 1
+
+ALGORITHMS = {"aes": 1, "rc4": 2}
+MODES = {"ctr": 1, "cbc": 2, "stream": 3}
+
+HEADER = struct.Struct(">4sBBHB3xIQQQ16s")
+INDEX_ENTRY = struct.Struct(">QI")
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+# Keystream bytes discarded after keying each RC4 chunk (RC4-drop[n])
+RC4_DROP = 1536
+
+_BLOCK_MASK = (1 << 128) - 1
+
+
+def _rc4_chunk_key(key: bytes, nonce: bytes, index: int) -> bytes:
+    """Key for RC4 chunk `index`, so chunks never share a keystream."""
+    return hashlib.sha256(key + nonce + index.to_bytes(8, 'big')).digest()
+
+
+def encrypted_length(mode: str, length: int) -> int:
+    """Ciphertext length of a chunk holding length plaintext bytes (CBC chunks are padded)."""
+    return length - length % 16 + 16 if mode == "cbc" else length
+
+
+def plan_index(length: int, chunk_size: int, mode: str) -> Tuple[List[Tuple[int, int]], int]:
+    """Index entries and index offset of a container for length plaintext bytes, known before encrypting.
+
+    Chunks can then be encrypted independently and written straight to their final offsets.
+    """
+    index = []
+    offset = HEADER.size
+    for start in range(0, length, chunk_size):
+        size = encrypted_length(mode, min(chunk_size, length - start))
+        index.append((offset, size))
+        offset += size
+    return index, offset
+
+
+def pack_header(algorithm: str, key_bits: int, mode: str, chunk_size: int, length: int, chunk_count: int,
+                index_offset: int, nonce: bytes) -> bytes:
+    return HEADER.pack(MAGIC, VERSION, ALGORITHMS[algorithm], key_bits, MODES[mode], chunk_size, length,
+                       chunk_count, index_offset, nonce)
+
+
+def plaintext_length(path: str) -> int:
+    """Plaintext length recorded in a container's header (readable without the key)."""
+    with open(path, 'rb') as file:
+        header = HEADER.unpack(file.read(HEADER.size))
+    if header[0] != MAGIC:
+        raise ValueError("Not an encrypted container")
+    return header[6]
+
+
+def pack_index(index: List[Tuple[int, int]]) -> bytes:
+    return b''.join(INDEX_ENTRY.pack(offset, length) for offset, length in index)
+
+
+class ChunkCipher:
+    """Encrypts and decrypts single chunks for one key, algorithm, mode and nonce.
+
+    Chunks are independent, so several processes can each encrypt a range of one container's chunks.
+    """
+
+    def __init__(self, key: bytes, algorithm: str, mode: str, chunk_size: int, nonce: bytes, engine: str):
+        self.key = key
+        self.algorithm = algorithm
+        self.mode = mode
+        self.chunk_size = chunk_size
+        self.nonce = nonce
+        self.counter = int.from_bytes(nonce, 'big')
+        if algorithm == "aes":
+            self.context = AES.new(key, engine=engine)
+
+    def _counter_block(self, block: int) -> bytes:
+        return ((self.counter + block) & _BLOCK_MASK).to_bytes(16, 'big')
+
+    def _cbc_iv(self, index: int) -> bytes:
+        return self.context.encrypt_block(self._counter_block(index))
+
+    def encrypt(self, index: int, data: bytes) -> bytes:
+        if self.algorithm == "rc4":
+            return RC4(_rc4_chunk_key(self.key, self.nonce, index), drop=RC4_DROP).update(data)
+        if self.mode == "cbc":
+            return self.context.encrypt_cbc(data, self._cbc_iv(index))
+        return self.context.encrypt_ctr(data, self._counter_block(index * self.chunk_size // 16))
+
+    def decrypt(self, index: int, data: bytes, skip: int = 0) -> bytes:
+        """Decrypt chunk `index`; stream ciphers can start `skip` bytes in, with data holding ciphertext from there on."""
+        if self.algorithm == "rc4":
+            cipher = RC4(_rc4_chunk_key(self.key, self.nonce, index), drop=RC4_DROP + skip)
+            return cipher.update(data)
+        if self.mode == "cbc":
+            return self.context.decrypt_cbc(data, self._cbc_iv(index))
+        # CTR: data starts at a block boundary `skip` bytes into the chunk
+        return self.context.decrypt_ctr(data, self._counter_block((index * self.chunk_size + skip) // 16))
+
+
+class ContainerWriter:
+    """Write plaintext into a container; chunks are encrypted as soon as they fill up.
+
+    The destination must be seekable: the header is rewritten with the index location on close().
+    """
+
+    def __init__(self, fileobj: BinaryIO, key: Union[bytes, str], algorithm: str = "aes", mode: str = "ctr",
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, nonce: Optional[bytes] = None, engine: str = "ttable"):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Algorithm must be one of {', '.join(ALGORITHMS)}")
+        if algorithm == "rc4":
+            mode = "stream"
+        elif mode not in ("ctr", "cbc"):
+            raise ValueError("AES mode must be ctr or cbc")
+        if engine not in ENGINES:
+            raise ValueError(f"Engine must be one of {', '.join(ENGINES)}")
+        if chunk_size <= 0 or chunk_size % 16 != 0:
+            raise ValueError("Chunk size must be a positive multiple of 16 bytes")
+        key = AES._coerce_key(key)
+        self.nonce = os.urandom(16) if nonce is None else nonce
+        if len(self.nonce) != 16:
+            raise ValueError("Nonce must be 16 bytes")
+
+        self.fileobj = fileobj
+        self.algorithm = algorithm
+        self.mode = mode
+        self.key_bits = len(key) * 8
+        self.chunk_size = chunk_size
+        self._cipher = ChunkCipher(key, algorithm, mode, chunk_size, self.nonce, engine)
+        self._buffer = bytearray()
+        self._index: List[Tuple[int, int]] = []
+        self._length = 0
+        self._closed = False
+        self._start = fileobj.tell()
+        fileobj.write(self._header(0))
+
+    def _header(self, index_offset: int) -> bytes:
+        return pack_header(self.algorithm, self.key_bits, self.mode, self.chunk_size, self._length,
+                           len(self._index), index_offset, self.nonce)
+
+    def _write_chunk(self, data: bytes) -> None:
+        encrypted = self._cipher.encrypt(len(self._index), data)
+        self._index.append((self.fileobj.tell() - self._start, len(encrypted)))
+        self.fileobj.write(encrypted)
+
+    def write(self, data: bytes) -> int:
+        if self._closed:
+            raise ValueError("Container is closed")
+        self._buffer += data
+        self._length += len(data)
+        full = len(self._buffer) - len(self._buffer) % self.chunk_size
+        for start in range(0, full, self.chunk_size):
+            self._write_chunk(bytes(self._buffer[start:start + self.chunk_size]))
+        del self._buffer[:full]
+        return len(data)
+
+    def close(self) -> None:
+        """Encrypt the final partial chunk, append the index and finalize the header."""
+        if self._closed:
+            return
+        if self._buffer:
+            self._write_chunk(bytes(self._buffer))
+            self._buffer.clear()
+        index_offset = self.fileobj.tell() - self._start
+        self.fileobj.write(pack_index(self._index))
+        end = self.fileobj.tell()
+        self.fileobj.seek(self._start)
+        self.fileobj.write(self._header(index_offset))
+        self.fileobj.seek(end)
+        self._closed = True
+
+    def __enter__(self) -> "ContainerWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class ContainerReader:
+    """Random-access decryption of a container read through a seekable file object."""
+
+    def __init__(self, fileobj: BinaryIO, key: Union[bytes, str], engine: str = "ttable"):
+        self.fileobj = fileobj
+        self._start = fileobj.tell() if hasattr(fileobj, "tell") else 0
+        (magic, version, algorithm, key_bits, mode, self.chunk_size, self.length, chunk_count,
+         index_offset, self.nonce) = HEADER.unpack(self._read_raw(0, HEADER.size))
+        if magic != MAGIC:
+            raise ValueError("Not an encrypted container")
+        if version != VERSION:
+            raise ValueError(f"Unsupported container version {version}")
+        self.algorithm = {value: name for name, value in ALGORITHMS.items()}[algorithm]
+        self.mode = {value: name for name, value in MODES.items()}[mode]
+        key = AES._coerce_key(key)
+        if len(key) * 8 != key_bits:
+            raise ValueError(f"Key must be {key_bits} bits")
+
+        raw_index = self._read_raw(index_offset, chunk_count * INDEX_ENTRY.size)
+        self.index = [INDEX_ENTRY.unpack_from(raw_index, i * INDEX_ENTRY.size) for i in range(chunk_count)]
+        self._cipher = ChunkCipher(key, self.algorithm, self.mode, self.chunk_size, self.nonce, engine)
+
+    def _read_raw(self, offset: int, length: int) -> bytes:
+        self.fileobj.seek(self._start + offset)
+        return self.fileobj.read(length)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def read_chunk(self, index: int) -> bytes:
+        """Decrypt one whole chunk."""
+        offset, length = self.index[index]
+        return self._cipher.decrypt(index, self._read_raw(offset, length))
+
+    def read_range(self, start: int, stop: int) -> bytes:
+        """Decrypt plaintext bytes [start, stop) touching only the chunks (and, for CTR/RC4, blocks) involved."""
+        start = max(0, start)
+        stop = min(stop, self.length)
+        if start >= stop:
+            return b''
+        pieces = []
+        for index in range(start // self.chunk_size, (stop - 1) // self.chunk_size + 1):
+            chunk_start = index * self.chunk_size
+            low = max(start, chunk_start) - chunk_start
+            high = min(stop, chunk_start + self.chunk_size) - chunk_start
+            offset, length = self.index[index]
+            if self.mode == "cbc":
+                pieces.append(self.read_chunk(index)[low:high])
+                continue
+            # Stream modes: read only the ciphertext from the first needed block onwards
+            skip = low - low % 16 if self.mode == "ctr" else low
+            data = self._cipher.decrypt(index, self._read_raw(offset + skip, high - skip), skip)
+            pieces.append(data[low - skip:])
+        return b''.join(pieces)
+
+    def read_all(self) -> bytes:
+        return b''.join(self.read_chunk(i) for i in range(len(self.index)))
+
+
+class MmapContainerReader(ContainerReader):
+    """ContainerReader over a memory-mapped file: ranges are sliced straight out of the mapping."""
+
+    def __init__(self, file_path: str, key: Union[bytes, str], engine: str = "ttable"):
+        self._file = open(file_path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        super().__init__(self._file, key, engine)
+
+    def _read_raw(self, offset: int, length: int) -> bytes:
+        return self._map[offset:offset + length]
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> "MmapContainerReader":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def encrypt_file(src_path: str, dst_path: str, key: Union[bytes, str], **options) -> None:
+    """Encrypt a file into a container, reading it one chunk at a time."""
+    with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst, ContainerWriter(dst, key, **options) as writer:
+        for chunk in iter(lambda: src.read(writer.chunk_size), b''):
+            writer.write(chunk)
+
+
+def decrypt_file(src_path: str, dst_path: str, key: Union[bytes, str], engine: str = "ttable") -> None:
+    """Decrypt a container into a file, one chunk at a time."""
+    with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+        reader = ContainerReader(src, key, engine)
+        for index in range(len(reader.index)):
+            dst.write(reader.read_chunk(index))
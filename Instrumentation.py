@@ -0,0 +1,56 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List
+
+from AES import hex_matrix
+
+
+class CipherMetrics:
+    """Counters (blocks, bytes, key expansions) and phase timers collected from an instrumented AES."""
+
+    def __init__(self):
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.phase_calls: Dict[str, int] = defaultdict(int)
+        self.phase_seconds: Dict[str, float] = defaultdict(float)
+
+    def count(self, name: str, amount: int = 1) -> None:
+        self.counters[name] += amount
+
+    @contextmanager
+    def phase(self, name: str):
+        """Add the wall time of the enclosed block to the named phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_seconds[name] += time.perf_counter() - start
+            self.phase_calls[name] += 1
+
+    def reset(self) -> None:
+        self.counters.clear()
+        self.phase_calls.clear()
+        self.phase_seconds.clear()
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Return a plain-dict copy of the counters and phase timers."""
+        return {
+            "counters": dict(self.counters),
+            "phases": {name: {"calls": self.phase_calls[name], "seconds": self.phase_seconds[name]}
+                       for name in self.phase_seconds},
+        }
+
+
+def print_round_state(step: str, round: int, state: List[List[int]]) -> None:
+    """Round callback printing the state after each step, for use with AES.set_instrumentation."""
+    print(f"Round {round} - State after {step}: {hex_matrix(state)}")
+
+
+class RoundRecorder:
+    """Round callback that keeps (step, round, state bytes) for every step it sees."""
+
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, step: str, round: int, state: List[List[int]]) -> None:
+        self.events.append((step, round, bytes(b for column in state for b in column)))
@@ -1,3 +1,6 @@
+import mmap
+import os
+
 def rc4_key_scheduling(key):
     """Key scheduling algorithm for RC4."""
     key_length = len(key)
@@ -19,9 +22,136 @@ def rc4_pseudo_random_generation(S, plaintext_length):
         keystream.append(S[(S[i] + S[j]) % 256])
     return keystream
 
+def _rc4_keystream(S, i, j, length):
+    """Continue the PRGA from (i, j) for length bytes; returns the keystream and the new (i, j)."""
+    keystream = bytearray(length)
+    for n in range(length):
+        i = (i + 1) % 256
+        j = (j + S[i]) % 256
+        S[i], S[j] = S[j], S[i]  # Swap
+        keystream[n] = S[(S[i] + S[j]) % 256]
+    return keystream, i, j
+
 def rc4_encrypt(plaintext, key):
     """Encrypt or decrypt plaintext using RC4 (symmetric)."""
     S = rc4_key_scheduling(key)
     keystream = rc4_pseudo_random_generation(S, len(plaintext))
     ciphertext = bytes([plaintext[i] ^ keystream[i] for i in range(len(plaintext))])
-    return ciphertext
\ No newline at end of file
+    return ciphertext
+
+def rc4_keystream_batch(keys, length, drop=0):
+    """Keystreams of K keys at once as a (K, length) uint8 NumPy array; row k is the RC4 keystream of keys[k].
+
+    The KSA and PRGA run on a (K, 256) state matrix with per-row j indices (i is shared by all rows), so the
+    Python-level loop takes 256 + drop + length steps whatever K is. The first drop bytes are discarded.
+    Requires numpy.
+    """
+    import numpy as np
+    if any(len(key) == 0 for key in keys):
+        raise ValueError("RC4 keys must not be empty")
+    count = len(keys)
+    rows = np.arange(count)
+    S = np.tile(np.arange(256, dtype=np.uint8), (count, 1))
+    # key[i % key_length] for every row and i, so keys of different lengths share one KSA loop
+    key_bytes = np.array([np.resize(np.frombuffer(bytes(key), dtype=np.uint8), 256) for key in keys],
+                         dtype=np.uint8).reshape(count, 256)
+
+    j = np.zeros(count, dtype=np.intp)
+    for i in range(256):
+        si = S[:, i].astype(np.intp)
+        j = (j + si + key_bytes[:, i]) & 0xFF
+        S[:, i] = S[rows, j]
+        S[rows, j] = si
+
+    # Built as (length, K) so each step writes one contiguous row
+    keystream = np.empty((length, count), dtype=np.uint8)
+    i = 0
+    j[:] = 0
+    for n in range(-drop, length):
+        i = (i + 1) & 0xFF
+        si = S[:, i].astype(np.intp)
+        j = (j + si) & 0xFF
+        sj = S[rows, j]
+        S[:, i] = sj
+        S[rows, j] = si
+        if n >= 0:
+            keystream[n] = S[rows, (si + sj) & 0xFF]
+    return np.ascontiguousarray(keystream.T)
+
+def rc4_encrypt_batch(plaintext, keys):
+    """Encrypt or decrypt one message under K keys; returns a (K, len(plaintext)) uint8 NumPy array."""
+    import numpy as np
+    keystream = rc4_keystream_batch(keys, len(plaintext))
+    return np.frombuffer(bytes(plaintext), dtype=np.uint8) ^ keystream
+
+class RC4:
+    """Resumable RC4 cipher: S, i and j persist between calls, so a long stream can be processed in pieces."""
+
+    def __init__(self, key, drop=0):
+        self.S = bytearray(rc4_key_scheduling(key))
+        self.i = self.j = 0
+        if drop:
+            self.skip(drop)  # RC4-drop[n]
+
+    def copy(self):
+        """Independent cipher continuing from the same state, without re-running the KSA."""
+        clone = RC4.__new__(RC4)
+        clone.S = bytearray(self.S)
+        clone.i, clone.j = self.i, self.j
+        return clone
+
+    def keystream(self, n):
+        """Return the next n keystream bytes."""
+        keystream, self.i, self.j = _rc4_keystream(self.S, self.i, self.j, n)
+        return bytes(keystream)
+
+    def skip(self, n, chunk_size=65536):
+        """Discard the next n keystream bytes without keeping them all in memory."""
+        while n > 0:
+            step = min(n, chunk_size)
+            _, self.i, self.j = _rc4_keystream(self.S, self.i, self.j, step)
+            n -= step
+
+    def update(self, data):
+        """Encrypt or decrypt the next piece of the stream."""
+        keystream, self.i, self.j = _rc4_keystream(self.S, self.i, self.j, len(data))
+        return (int.from_bytes(data, 'big') ^ int.from_bytes(keystream, 'big')).to_bytes(len(data), 'big')
+
+    def update_into(self, src, dst=None, span_size=65536):
+        """Encrypt or decrypt a buffer in place (or into dst) span by span; returns the bytes processed."""
+        source = memoryview(src).cast('B')
+        target = source if dst is None else memoryview(dst).cast('B')
+        if target.readonly:
+            raise TypeError("Output buffer must be writable")
+        if len(target) < len(source):
+            raise ValueError("Output buffer is smaller than the input")
+        for start in range(0, len(source), span_size):
+            stop = min(start + span_size, len(source))
+            target[start:stop] = self.update(source[start:stop])
+        return len(source)
+
+def rc4_encrypt_into(src, key, dst=None):
+    """Encrypt or decrypt a writable buffer (bytearray, mmap, memoryview) in place or into dst."""
+    return RC4(key).update_into(src, dst)
+
+def rc4_encrypt_file_inplace(file_path, key):
+    """Memory-map a file and encrypt or decrypt it in place."""
+    with open(file_path, 'r+b') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return 0
+        with mmap.mmap(file.fileno(), 0) as mapped:
+            processed = rc4_encrypt_into(mapped, key)
+            mapped.flush()
+    return processed
+
+def rc4_encrypt_stream(src, dst, key, chunk_size=65536):
+    """Encrypt or decrypt a file object chunk by chunk, carrying the RC4 state between chunks."""
+    cipher = RC4(key)
+    written = 0
+    while True:
+        chunk = src.read(chunk_size)
+        if not chunk:
+            break
+        dst.write(cipher.update(chunk))
+        written += len(chunk)
+    return written
@@ -0,0 +1,11 @@
+"""Byte-size parsing shared by the command-line tools (benchmark.py, batchcrypt.py)."""
+
+UNITS = {"K": 1024, "M": 1024 * 1024, "G": 1024 * 1024 * 1024}
+
+
+def parse_size(text: str) -> int:
+    """Parse sizes such as 4096, 64K or 16M."""
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in UNITS:
+        return int(text[:-1]) * UNITS[text[-1]]
+    return int(text)
@@ -0,0 +1,368 @@
+"""Encrypt or decrypt whole directory trees or file lists with AES or RC4 on a pool of worker processes.
+
+Usage:
+    python batchcrypt.py encrypt exports/ --output encrypted/ --key 000102030405060708090a0b0c0d0e0f --mode ctr
+    python batchcrypt.py decrypt encrypted/ --output restored/ --key 000102030405060708090a0b0c0d0e0f --summary run.json
+
+Every file becomes an encrypted container (see Container.py) with its own random nonce, named with a .rcae
+suffix. Files larger than the task size are split into chunk ranges that workers encrypt in parallel and write
+straight to their final offsets; smaller files are grouped so each task carries about task-size bytes.
+Decryption reads the algorithm, mode and chunk size from each container header, so it only needs the key.
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Tuple
+
+import Backends
+from AES import ENGINES
+from Container import (DEFAULT_CHUNK_SIZE, ChunkCipher, ContainerReader, decrypt_file, encrypt_file, pack_header,
+                       pack_index, plaintext_length, plan_index)
+from Sizes import parse_size
+
+SUFFIX = ".rcae"
+
+# Bytes of work per pool task: larger files are split into pieces of this size, smaller ones grouped up to it
+DEFAULT_TASK_SIZE = 8 * 1024 * 1024
+
+# Most files in one grouped task, so directories of empty or tiny files still spread across workers
+MAX_GROUP_FILES = 256
+
+# Seconds between progress line updates
+PROGRESS_INTERVAL = 0.5
+
+# Key, algorithm, mode, chunk size and engine installed in each pool worker by _init_worker
+_worker_config = None
+
+
+def _init_worker(config: Dict) -> None:
+    global _worker_config
+    _worker_config = config
+
+
+def choose_engine(chunk_size: int) -> str:
+    """AES engine for containers of chunk_size-byte chunks: the calibrated backend if it is a round engine.
+
+    Containers run CTR/CBC on an AESContext, so the NumPy backend cannot be used and falls back to the default.
+    """
+    name = Backends.choose("aes", chunk_size)
+    return name if name in ENGINES else Backends.DEFAULT_BACKENDS["aes"]
+
+
+def _output_path(path: str, op: str) -> str:
+    if op == "encrypt":
+        return path + SUFFIX
+    return path[:-len(SUFFIX)] if path.endswith(SUFFIX) else path + ".dec"
+
+
+def _plaintext_size(path: str, op: str) -> int:
+    """Plaintext bytes a file holds or will produce: progress and summaries count plaintext for both ops."""
+    if op == "decrypt":
+        try:
+            return plaintext_length(path)
+        except (ValueError, struct.error):
+            pass  # not a container: the worker reports the error, the size only affects scheduling
+    return os.path.getsize(path)
+
+
+def collect_files(paths: List[str], output: str, op: str) -> List[Tuple[str, str, int]]:
+    """(source, destination, plaintext size) for every input file; directories are walked and mirrored under output.
+
+    Without output, results are written next to their sources. When decrypting a directory only .rcae files
+    are taken. Raises ValueError when two different inputs map to the same destination (e.g. files with the
+    same name from different directories under one output).
+    """
+    files = []
+    sources = {}
+
+    def add(src: str, relative: str) -> None:
+        dst = _output_path(os.path.join(output, relative) if output else src, op)
+        target = os.path.abspath(dst)
+        if target in sources:
+            if os.path.abspath(sources[target]) == os.path.abspath(src):
+                return  # the same file given twice
+            raise ValueError(f"{sources[target]} and {src} would both be written to {dst}")
+        sources[target] = src
+        files.append((src, dst, _plaintext_size(src, op)))
+
+    for path in paths:
+        if not os.path.isdir(path):
+            add(path, os.path.basename(path))
+            continue
+        for root, dirs, names in os.walk(path):
+            dirs.sort()
+            for name in sorted(names):
+                if op == "decrypt" and not name.endswith(SUFFIX):
+                    continue
+                src = os.path.join(root, name)
+                add(src, os.path.relpath(src, path))
+    return files
+
+
+def _prepare_encrypted(dst: str, size: int, config: Dict) -> Tuple[bytes, List[Tuple[int, int]]]:
+    """Write the header and index of a split file's container, leaving its chunk area for the workers."""
+    nonce = os.urandom(16)
+    index, index_offset = plan_index(size, config["chunk_size"], config["mode"])
+    with open(dst, 'wb') as file:
+        file.write(pack_header(config["algorithm"], len(config["key"]) * 8, config["mode"], config["chunk_size"],
+                               size, len(index), index_offset, nonce))
+        file.seek(index_offset)
+        file.write(pack_index(index))
+    return nonce, index
+
+
+def plan_tasks(files: List[Tuple[str, str, int]], op: str, config: Dict,
+               task_size: int) -> Tuple[List[Tuple], Dict[str, str]]:
+    """Split large files into chunk-range tasks and group small files, largest work first.
+
+    Destination directories are created here, and split files get their output preallocated, so workers only
+    ever write into files that already exist. Returns the tasks and the files that failed preparation.
+    """
+    split, grouped = [], []
+    errors = {}
+    group, group_bytes = [], 0
+    for src, dst, size in sorted(files, key=lambda file: -file[2]):
+        os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+        if size <= task_size:
+            group.append((src, dst))
+            group_bytes += size
+            if group_bytes >= task_size or len(group) >= MAX_GROUP_FILES:
+                grouped.append(("files", group))
+                group, group_bytes = [], 0
+            continue
+
+        try:
+            if op == "encrypt":
+                chunk_size = config["chunk_size"]
+                nonce, index = _prepare_encrypted(dst, size, config)
+            else:
+                with open(src, 'rb') as file:
+                    reader = ContainerReader(file, config["key"], config["engine"])
+                chunk_size, index = reader.chunk_size, reader.index
+                with open(dst, 'wb') as file:
+                    file.truncate(reader.length)
+        except (OSError, ValueError, KeyError, struct.error) as e:
+            errors[src] = f"{type(e).__name__}: {e}"
+            continue
+        per_task = max(1, task_size // chunk_size)
+        for first in range(0, len(index), per_task):
+            stop = min(first + per_task, len(index))
+            if op == "encrypt":
+                split.append(("encrypt_chunks", src, dst, nonce, first, index[first:stop]))
+            else:
+                split.append(("decrypt_chunks", src, dst, first, stop))
+    if group:
+        grouped.append(("files", group))
+    return split + grouped, errors
+
+
+def _run_task(task: Tuple) -> List[Dict]:
+    """Run one task in a worker; returns one record (source, bytes, seconds, error) per file touched."""
+    config = _worker_config
+    kind = task[0]
+    records = []
+    if kind == "files":
+        for src, dst in task[1]:
+            start = time.perf_counter()
+            size = 0
+            error = None
+            try:
+                if config["op"] == "encrypt":
+                    size = os.path.getsize(src)
+                    encrypt_file(src, dst, config["key"], algorithm=config["algorithm"], mode=config["mode"],
+                                 chunk_size=config["chunk_size"], engine=config["engine"])
+                else:
+                    decrypt_file(src, dst, config["key"], config["engine"])
+                    size = os.path.getsize(dst)
+            except (OSError, ValueError, KeyError, struct.error) as e:
+                error = f"{type(e).__name__}: {e}"
+            records.append({"path": src, "bytes": 0 if error else size,
+                            "seconds": time.perf_counter() - start, "error": error})
+        return records
+
+    src, dst = task[1], task[2]
+    start = time.perf_counter()
+    processed = 0
+    error = None
+    try:
+        with open(src, 'rb') as fin, open(dst, 'r+b') as fout:
+            if kind == "encrypt_chunks":
+                nonce, first, entries = task[3:]
+                chunk_size = config["chunk_size"]
+                cipher = ChunkCipher(config["key"], config["algorithm"], config["mode"], chunk_size, nonce,
+                                     config["engine"])
+                for index, (offset, _) in enumerate(entries, first):
+                    fin.seek(index * chunk_size)
+                    data = fin.read(chunk_size)
+                    fout.seek(offset)
+                    fout.write(cipher.encrypt(index, data))
+                    processed += len(data)
+            else:
+                first, stop = task[3:]
+                reader = ContainerReader(fin, config["key"], config["engine"])
+                for index in range(first, stop):
+                    data = reader.read_chunk(index)
+                    fout.seek(index * reader.chunk_size)
+                    fout.write(data)
+                    processed += len(data)
+    except (OSError, ValueError, KeyError, struct.error) as e:
+        error = f"{type(e).__name__}: {e}"
+    return [{"path": src, "bytes": processed, "seconds": time.perf_counter() - start, "error": error}]
+
+
+class Progress:
+    """Live files / MB / MB/s line on stderr, updated at most every PROGRESS_INTERVAL seconds.
+
+    On a terminal the line is redrawn in place; otherwise (logs of scheduled runs) each update is a new line.
+    """
+
+    def __init__(self, total_files: int, total_bytes: int, enabled: bool):
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.enabled = enabled
+        self.inline = sys.stderr.isatty()
+        self.files = 0
+        self.bytes = 0
+        self.start = time.perf_counter()
+        self._drawn = self.start
+
+    def update(self, files: int, processed: int) -> None:
+        self.files += files
+        self.bytes += processed
+        now = time.perf_counter()
+        if self.enabled and (now - self._drawn >= PROGRESS_INTERVAL or self.files == self.total_files):
+            self._drawn = now
+            if self.inline:
+                print(f"\r{self.line()}", end="", file=sys.stderr, flush=True)
+            else:
+                print(self.line(), file=sys.stderr, flush=True)
+
+    def line(self) -> str:
+        elapsed = time.perf_counter() - self.start
+        rate = self.bytes / elapsed / 1e6 if elapsed else 0.0
+        return (f"{self.files}/{self.total_files} files  {self.bytes / 1e6:.1f}/{self.total_bytes / 1e6:.1f} MB  "
+                f"{rate:.2f} MB/s")
+
+    def finish(self) -> None:
+        if self.enabled and self.inline:
+            print(f"\r{self.line()}", file=sys.stderr)
+
+
+def run(files: List[Tuple[str, str, int]], op: str, config: Dict, workers: int, task_size: int,
+        show_progress: bool = True) -> Dict:
+    """Encrypt or decrypt files on a process pool and return the summary report."""
+    config = dict(config, op=op)
+    start = time.perf_counter()
+    tasks, errors = plan_tasks(files, op, config, task_size)
+    per_file = {src: {"path": src, "output": dst, "bytes": 0, "seconds": 0.0, "tasks": 0, "error": errors.get(src)}
+                for src, dst, _ in files}
+    remaining = {src: 0 for src in per_file}
+    for task in tasks:
+        for src in ([src for src, _ in task[1]] if task[0] == "files" else [task[1]]):
+            remaining[src] += 1
+
+    progress = Progress(len(files), sum(size for _, _, size in files), show_progress)
+    progress.update(len(errors), 0)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config,)) as pool:
+        for future in as_completed([pool.submit(_run_task, task) for task in tasks]):
+            finished = 0
+            processed = 0
+            for record in future.result():
+                entry = per_file[record["path"]]
+                entry["bytes"] += record["bytes"]
+                entry["seconds"] += record["seconds"]
+                entry["tasks"] += 1
+                entry["error"] = entry["error"] or record["error"]
+                processed += record["bytes"]
+                remaining[record["path"]] -= 1
+                finished += remaining[record["path"]] == 0
+            progress.update(finished, processed)
+    progress.finish()
+
+    failures = [entry for entry in per_file.values() if entry["error"]]
+    for entry in failures:
+        if os.path.exists(entry["output"]):
+            os.remove(entry["output"])  # never leave a partial or wrongly decrypted file behind
+    elapsed = time.perf_counter() - start
+    total = sum(entry["bytes"] for entry in per_file.values())
+    return {
+        "op": op,
+        "algorithm": config["algorithm"],
+        "mode": config["mode"],
+        "key_bits": len(config["key"]) * 8,
+        "workers": workers,
+        "files": len(files),
+        "failed": len(failures),
+        "bytes": total,
+        "seconds": elapsed,
+        "mb_per_s": total / elapsed / 1e6 if elapsed else 0.0,
+        "per_file": list(per_file.values()),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Encrypt or decrypt directory trees with AES or RC4.")
+    parser.add_argument("op", choices=("encrypt", "decrypt"))
+    parser.add_argument("paths", nargs="+", help="files and directories to process")
+    parser.add_argument("--output", help="directory mirroring the inputs (default: next to each source file)")
+    key_group = parser.add_mutually_exclusive_group(required=True)
+    key_group.add_argument("--key", help="key as hex (AES: 16, 24 or 32 bytes)")
+    key_group.add_argument("--key-file", help="file holding the raw key bytes")
+    parser.add_argument("--algorithm", choices=("aes", "rc4"), default="aes",
+                        help="cipher for encryption (decryption reads it from each file)")
+    parser.add_argument("--mode", choices=("ctr", "cbc"), default="ctr", help="AES mode for encryption")
+    parser.add_argument("--engine", choices=("auto",) + ENGINES, default="auto",
+                        help="AES round engine (default: the one Backends.py calibrated for the chunk size)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--chunk-size", type=parse_size, default=DEFAULT_CHUNK_SIZE,
+                        help="container chunk size for encryption (default 1M)")
+    parser.add_argument("--task-size", type=parse_size, default=DEFAULT_TASK_SIZE,
+                        help="bytes per worker task: larger files are split, smaller ones grouped (default 8M)")
+    parser.add_argument("--summary", help="write a JSON summary with per-file timings to this file")
+    parser.add_argument("--quiet", action="store_true", help="no progress line")
+    args = parser.parse_args(argv)
+
+    if args.key_file:
+        with open(args.key_file, 'rb') as file:
+            key = file.read()
+    else:
+        try:
+            key = bytes.fromhex(args.key)
+        except ValueError:
+            parser.error("--key must be hex")
+    if args.algorithm == "aes" and len(key) * 8 not in (128, 192, 256) and args.op == "encrypt":
+        parser.error("AES keys must be 16, 24 or 32 bytes")
+    if args.chunk_size <= 0 or args.chunk_size % 16 != 0:
+        parser.error("--chunk-size must be a positive multiple of 16 bytes")
+
+    try:
+        files = collect_files(args.paths, args.output, args.op)
+    except ValueError as e:
+        parser.error(str(e))
+    if not files:
+        print("No input files", file=sys.stderr)
+        return 0
+    config = {"key": key, "algorithm": args.algorithm, "mode": "stream" if args.algorithm == "rc4" else args.mode,
+              "chunk_size": args.chunk_size,
+              "engine": choose_engine(args.chunk_size) if args.engine == "auto" else args.engine}
+    report = run(files, args.op, config, max(1, args.workers), max(args.task_size, args.chunk_size),
+                 show_progress=not args.quiet)
+
+    print(f"{args.op.capitalize()}ed {report['files'] - report['failed']}/{report['files']} files, "
+          f"{report['bytes'] / 1e6:.1f} MB in {report['seconds']:.2f}s ({report['mb_per_s']:.2f} MB/s)")
+    for entry in report["per_file"]:
+        if entry["error"]:
+            print(f"  {entry['path']}: {entry['error']}", file=sys.stderr)
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        print(f"Summary saved as {args.summary}")
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""Throughput benchmark and regression check for the AES and RC4 implementations.
+
+Usage:
+    python benchmark.py --output results.json
+    python benchmark.py --engine ttable --max-size 1M --baseline baseline.json --threshold 10
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+import RC4
+from AES import AES, ENGINES
+from Sizes import parse_size
+
+PAYLOAD_SIZES = [16, 256, 4 * 1024, 64 * 1024, 1024 * 1024, 16 * 1024 * 1024, 64 * 1024 * 1024]
+KEY_SIZES = (128, 192, 256)
+
+# Default --max-size per engine: the step-by-step reference engine runs at a few hundredths of a MB/s, where
+# the full 64 MB ladder would take hours
+DEFAULT_MAX_SIZES = {"reference": 64 * 1024, "ttable": 1024 * 1024, "compact": 1024 * 1024}
+
+# FIPS-197 Appendix C: (key size, key, plaintext, ciphertext)
+FIPS197_VECTORS = [
+    (128, "000102030405060708090a0b0c0d0e0f",
+     "00112233445566778899aabbccddeeff", "69c4e0d86a7b0430d8cdb78070b4c55a"),
+    (192, "000102030405060708090a0b0c0d0e0f1011121314151617",
+     "00112233445566778899aabbccddeeff", "dda97ca4864cdfe06eaf70a0ec0d7191"),
+    (256, "000102030405060708090a0b0c0d0e0f101112131415161718191a1b1c1d1e1f",
+     "00112233445566778899aabbccddeeff", "8ea2b7ca516745bfeafc49904b496089"),
+]
+
+# RFC 6229 section 2: (key, keystream offset, 16 keystream bytes)
+RFC6229_VECTORS = [
+    ("0102030405", 0, "b2396305f03dc027ccc3524a0a1118a8"),
+    ("0102030405", 16, "6982944f18fc82d589c403a47a0d0919"),
+    ("0102030405", 4096, "ff25b58995996707e51fbdf08b34d875"),
+    ("0102030405060708090a0b0c0d0e0f10", 0, "9ac7cc9a609d1ef7b2932899cde41b97"),
+    ("0102030405060708090a0b0c0d0e0f10", 16, "5248c4959014126a6e8a84f11d1a9e1c"),
+    ("0102030405060708090a0b0c0d0e0f10", 4096, "a36a4c301ae8ac13610ccbc12256cacc"),
+]
+
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size over the whole life of this process (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def peak_allocation(function: Callable[[], object]) -> int:
+    """Peak bytes allocated (Python and NumPy heaps, via tracemalloc) during one call of function.
+
+    Unlike ru_maxrss, this is measured afresh for each call, so it is specific to one benchmark.
+    """
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        function()
+        return tracemalloc.get_traced_memory()[1] - start
+    finally:
+        tracemalloc.stop()
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def check_vectors(engine: str) -> List[str]:
+    """Return a description of every FIPS-197 / RFC 6229 vector the implementations get wrong."""
+    failures = []
+    for key_size, key, plaintext, ciphertext in FIPS197_VECTORS:
+        aes = AES(key_size, engine)
+        key, plaintext = bytes.fromhex(key), bytes.fromhex(plaintext)
+        if aes._encrypt_block(plaintext, key).hex() != ciphertext:
+            failures.append(f"FIPS-197 AES-{key_size} encrypt ({engine})")
+        if aes._decrypt_block(bytes.fromhex(ciphertext), key) != plaintext:
+            failures.append(f"FIPS-197 AES-{key_size} decrypt ({engine})")
+    for key, offset, expected in RFC6229_VECTORS:
+        S = RC4.rc4_key_scheduling(bytes.fromhex(key))
+        keystream = RC4.rc4_pseudo_random_generation(S, offset + 16)[offset:]
+        if bytes(keystream).hex() != expected:
+            failures.append(f"RFC 6229 key {key} offset {offset}")
+    return failures
+
+
+def measure(function: Callable[[], object], repeat: int, time_budget: float) -> List[float]:
+    """Run function up to repeat times (at least once), stopping early once time_budget seconds are spent."""
+    samples = []
+    spent = 0.0
+    while len(samples) < repeat and (not samples or spent < time_budget):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        samples.append(elapsed)
+        spent += elapsed
+    return samples
+
+
+def summarize(samples: List[float], payload: int, peak_bytes: int) -> Dict[str, float]:
+    """Throughput and latency statistics for samples that each processed payload bytes."""
+    median = percentile(samples, 50)
+    return {
+        "payload_bytes": payload,
+        "runs": len(samples),
+        "mb_per_s": payload / median / 1e6 if median else float("inf"),
+        "blocks_per_s": payload / 16 / median if median else float("inf"),
+        "latency_p50_ms": median * 1e3,
+        "latency_p90_ms": percentile(samples, 90) * 1e3,
+        "latency_p99_ms": percentile(samples, 99) * 1e3,
+        "latency_max_ms": max(samples) * 1e3,
+        "peak_alloc_bytes": peak_bytes,
+    }
+
+
+def run_benchmarks(engine: str, sizes: List[int], repeat: int, time_budget: float, progress=print) -> Dict:
+    results = {}
+
+    def record(name: str, payload: int, function: Callable[[], object]) -> None:
+        # The traced call doubles as the warm-up; tracemalloc slows allocation, so it is not timed
+        peak = peak_allocation(function)
+        results[f"{name}@{payload}"] = summarize(measure(function, repeat, time_budget), payload, peak)
+        stats = results[f"{name}@{payload}"]
+        progress(f"{name:<32} {payload:>10} B  {stats['mb_per_s']:10.3f} MB/s  "
+                 f"p50 {stats['latency_p50_ms']:10.3f} ms  p99 {stats['latency_p99_ms']:10.3f} ms  "
+                 f"peak {stats['peak_alloc_bytes'] / 1e6:8.2f} MB")
+
+    for key_size in KEY_SIZES:
+        aes = AES(key_size, engine)
+        key = os.urandom(key_size // 8)
+        block = os.urandom(16)
+        prefix = f"aes{key_size}"
+        record(f"{prefix}.key_expansion", len(key), lambda: aes.key_expansion(key))
+        record(f"{prefix}._encrypt_block", 16, lambda: aes._encrypt_block(block, key))
+        record(f"{prefix}._decrypt_block", 16, lambda: aes._decrypt_block(block, key))
+        for size in sizes:
+            plaintext = os.urandom(size)
+            ciphertext = aes.encrypt(plaintext, key)
+            record(f"{prefix}.encrypt", size, lambda: aes.encrypt(plaintext, key))
+            record(f"{prefix}.decrypt", size, lambda: aes.decrypt(ciphertext, key))
+
+    rc4_key = os.urandom(16)
+    record("rc4.rc4_key_scheduling", len(rc4_key), lambda: RC4.rc4_key_scheduling(rc4_key))
+    S = RC4.rc4_key_scheduling(rc4_key)
+    for size in sizes:
+        record("rc4.rc4_pseudo_random_generation", size, lambda: RC4.rc4_pseudo_random_generation(list(S), size))
+    return results
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """List the benchmarks whose throughput dropped by more than threshold percent against the baseline."""
+    regressions = []
+    for name, stats in results.items():
+        previous = baseline.get(name)
+        if not previous or not previous.get("mb_per_s"):
+            continue
+        change = (stats["mb_per_s"] - previous["mb_per_s"]) / previous["mb_per_s"] * 100
+        if change < -threshold:
+            regressions.append(f"{name}: {previous['mb_per_s']:.3f} -> {stats['mb_per_s']:.3f} MB/s ({change:+.1f}%)")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark AES and RC4 throughput.")
+    parser.add_argument("--engine", choices=ENGINES, default="ttable", help="AES round engine")
+    parser.add_argument("--max-size", type=parse_size,
+                        help="largest payload to run, up to 64M (default: 64K for reference, 1M otherwise)")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per benchmark for latency percentiles")
+    parser.add_argument("--time-budget", type=float, default=2.0,
+                        help="stop repeating a benchmark after this many seconds (it always runs once)")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="percent throughput drop counted as a regression")
+    args = parser.parse_args(argv)
+
+    failures = check_vectors(args.engine)
+    if failures:
+        for failure in failures:
+            print(f"Known-answer test failed: {failure}", file=sys.stderr)
+        return 2
+    print("FIPS-197 and RFC 6229 known-answer tests passed")
+
+    max_size = DEFAULT_MAX_SIZES[args.engine] if args.max_size is None else args.max_size
+    sizes = [size for size in PAYLOAD_SIZES if size <= max_size]
+    results = run_benchmarks(args.engine, sizes, args.repeat, args.time_budget)
+    report = {
+        "engine": args.engine,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "process_peak_rss_bytes": peak_rss_bytes(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        print(f"Results saved as {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline.get("results", {}), args.threshold)
+        if regressions:
+            print(f"Throughput regressions beyond {args.threshold}%:", file=sys.stderr)
+            for regression in regressions:
+                print(f"  {regression}", file=sys.stderr)
+            return 1
+        print(f"No regressions beyond {args.threshold}% against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
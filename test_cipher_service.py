@@ -0,0 +1,157 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import Backends
+import CipherService as cipher_service
+from AES import AES
+from CipherService import FRAME_LENGTH, BatchCoalescer, CipherClient, CipherService, loadgen, read_frame
+
+
+# Fixed backends, so the tests neither time a calibration nor depend on the machine they run on
+PINNED_SELECTION = {"aes": ["ttable"] * 4, "rc4": ["stream"] * 4}
+
+
+def pin_backends(test: unittest.TestCase) -> None:
+    """Pin PINNED_SELECTION and point the calibration cache at a temporary file for the duration of test."""
+    cache_dir = tempfile.TemporaryDirectory()
+    previous = os.environ.get("CIPHER_BACKEND_CACHE")
+    os.environ["CIPHER_BACKEND_CACHE"] = os.path.join(cache_dir.name, "cipher_backends.json")
+    Backends.set_selection(PINNED_SELECTION)
+
+    def restore() -> None:
+        Backends.set_selection(None)
+        if previous is None:
+            del os.environ["CIPHER_BACKEND_CACHE"]
+        else:
+            os.environ["CIPHER_BACKEND_CACHE"] = previous
+        cache_dir.cleanup()
+    test.addCleanup(restore)
+
+
+class CipherServiceTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        pin_backends(self)
+        self.executor = ThreadPoolExecutor(2)
+        self.service = CipherService(self.executor, max_pending=2)
+        self.server = await asyncio.start_server(self.service.handle_connection, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.executor.shutdown()
+
+    async def _send_raw(self, data: bytes, reset: bool = False):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        writer.write(data)
+        await writer.drain()
+        if reset:
+            writer.transport.abort()
+            return None
+        frame = await asyncio.wait_for(read_frame(reader), 5)
+        writer.close()
+        return frame
+
+    async def test_malformed_frames_release_their_slots(self):
+        bad_json = b"{not json"
+        not_a_dict = json.dumps([1, 2, 3]).encode()
+        bad_length = json.dumps({"length": "ten"}).encode()
+        for header in (bad_json, not_a_dict, bad_length, bad_json, not_a_dict):
+            response, _ = await self._send_raw(FRAME_LENGTH.pack(len(header)) + header)
+            self.assertFalse(response["ok"])
+            self.assertIn("Malformed frame", response["error"])
+        for _ in range(3):
+            await self._send_raw(FRAME_LENGTH.pack(100) + b"{", reset=True)
+        await asyncio.sleep(0.05)
+
+        # More bad clients than max_pending came and went; a valid request must still be served
+        key, data = os.urandom(16), b"still served"
+        client = await CipherClient.connect(port=self.port)
+        try:
+            ciphertext = await asyncio.wait_for(client.encrypt("aes", key, data), 5)
+        finally:
+            await client.close()
+        self.assertEqual(ciphertext, AES(128, "ttable").encrypt(data, key))
+
+    async def test_bad_field_type_gets_an_error_reply(self):
+        header = json.dumps({"id": 7, "op": "encrypt", "algorithm": "aes", "key": 123, "length": 0}).encode()
+        response, _ = await self._send_raw(FRAME_LENGTH.pack(len(header)) + header)
+        self.assertEqual(response["id"], 7)
+        self.assertFalse(response["ok"])
+
+    async def test_stats_request(self):
+        client = await CipherClient.connect(port=self.port)
+        try:
+            stats = await asyncio.wait_for(client.stats(), 5)
+        finally:
+            await client.close()
+        self.assertIn("batches", stats)
+
+    async def test_loadgen_percentiles_come_from_raw_latencies(self):
+        args = argparse.Namespace(host="127.0.0.1", port=self.port, unix=None, connections=4, requests=40, size=64,
+                                  algorithm="aes", mode="ecb", key_size=128, keys=2)
+        report = await asyncio.wait_for(loadgen(args), 10)
+        self.assertEqual(report["requests"], 40)
+        # Histogram bucket edges could exceed the slowest request; exact percentiles never do
+        self.assertLessEqual(report["p50_ms"], report["p99_ms"])
+        self.assertLessEqual(report["p99_ms"], report["max_ms"])
+
+
+class ProcessBatchTest(unittest.TestCase):
+    def setUp(self):
+        pin_backends(self)
+        # Small payloads on ttable, anything over 256 bytes on compact
+        Backends.set_selection({"aes": ["ttable", "compact", "compact", "compact"], "rc4": ["stream"] * 4})
+
+    def test_backend_follows_how_the_batch_runs(self):
+        key = os.urandom(16)
+        items = [(os.urandom(100), os.urandom(16)) for _ in range(20)]  # 2000 bytes in total
+        cipher_service._contexts.clear()
+        ctr = cipher_service.process_batch("aes", "encrypt", "ctr", key, items)
+        self.assertEqual([backend for _, backend, _ in cipher_service._contexts], ["ttable"])  # per item
+
+        cipher_service._contexts.clear()
+        ecb = cipher_service.process_batch("aes", "encrypt", "ecb", key, items)
+        self.assertEqual([backend for _, backend, _ in cipher_service._contexts], ["compact"])  # whole batch
+
+        context = AES.new(key, engine="ttable")
+        self.assertEqual(ctr, [(True, context.encrypt_ctr(payload, iv)) for payload, iv in items])
+        self.assertEqual(ecb, [(True, context.encrypt(payload)) for payload, _ in items])
+
+
+class ImportTest(unittest.TestCase):
+    def test_import_does_not_load_numpy(self):
+        code = "import sys, CipherService; print('numpy' in sys.modules)"
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(result.stdout.strip(), "False")
+
+
+class BatchCoalescerTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        pin_backends(self)
+
+    async def test_full_batch_cancels_its_timer(self):
+        delay = 0.2
+        with ThreadPoolExecutor(1) as executor:
+            coalescer = BatchCoalescer(executor, max_batch=2, max_delay=delay)
+            batch_key = ("rc4", "encrypt", "stream", b"key")
+            first = [asyncio.create_task(coalescer.submit(batch_key, (b"a", None))) for _ in range(2)]
+            await asyncio.gather(*first)  # flushed because it was full, not by its timer
+            await asyncio.sleep(delay / 2)
+            start = time.perf_counter()
+            await coalescer.submit(batch_key, (b"b", None))
+            # A stale timer from the first batch would flush this one after only delay / 2
+            self.assertGreaterEqual(time.perf_counter() - start, delay * 0.9)
+
+
+if __name__ == "__main__":
+    unittest.main()
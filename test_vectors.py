@@ -0,0 +1,95 @@
+import importlib.util
+import unittest
+
+import RC4
+from AES import AES, ENGINES
+from AvalancheAnalysis import RC4_BATCH_MIN_KEYS, rc4_encrypt_keys
+
+HAS_NUMPY = importlib.util.find_spec("numpy") is not None
+
+# FIPS-197 Appendix C.1-C.3: (key size, key, plaintext, ciphertext)
+FIPS197_VECTORS = [
+    (128, "000102030405060708090a0b0c0d0e0f",
+     "00112233445566778899aabbccddeeff", "69c4e0d86a7b0430d8cdb78070b4c55a"),
+    (192, "000102030405060708090a0b0c0d0e0f1011121314151617",
+     "00112233445566778899aabbccddeeff", "dda97ca4864cdfe06eaf70a0ec0d7191"),
+    (256, "000102030405060708090a0b0c0d0e0f101112131415161718191a1b1c1d1e1f",
+     "00112233445566778899aabbccddeeff", "8ea2b7ca516745bfeafc49904b496089"),
+]
+
+# RFC 6229 section 2: (key, keystream offset, 16 keystream bytes)
+RFC6229_VECTORS = [
+    ("0102030405", 0, "b2396305f03dc027ccc3524a0a1118a8"),
+    ("0102030405", 16, "6982944f18fc82d589c403a47a0d0919"),
+    ("0102030405", 4096, "ff25b58995996707e51fbdf08b34d875"),
+    ("0102030405060708090a0b0c0d0e0f10", 0, "9ac7cc9a609d1ef7b2932899cde41b97"),
+    ("0102030405060708090a0b0c0d0e0f10", 16, "5248c4959014126a6e8a84f11d1a9e1c"),
+    ("0102030405060708090a0b0c0d0e0f10", 4096, "a36a4c301ae8ac13610ccbc12256cacc"),
+]
+
+
+class FIPS197Test(unittest.TestCase):
+    def test_blocks(self):
+        for engine in ENGINES:
+            for key_size, key, plaintext, ciphertext in FIPS197_VECTORS:
+                with self.subTest(engine=engine, key_size=key_size):
+                    context = AES.new(bytes.fromhex(key), engine=engine)
+                    self.assertEqual(context.encrypt_block(bytes.fromhex(plaintext)).hex(), ciphertext)
+                    self.assertEqual(context.decrypt_block(bytes.fromhex(ciphertext)).hex(), plaintext)
+
+    def test_public_encrypt_and_decrypt(self):
+        # ECB with PKCS#7: the first block is the bare vector, the second is the encrypted padding block
+        for engine in ENGINES:
+            for key_size, key, plaintext, ciphertext in FIPS197_VECTORS:
+                with self.subTest(engine=engine, key_size=key_size):
+                    aes = AES(key_size, engine, cache_size=2)
+                    key, plaintext = bytes.fromhex(key), bytes.fromhex(plaintext)
+                    encrypted = aes.encrypt(plaintext, key)
+                    self.assertEqual(encrypted[:16].hex(), ciphertext)
+                    self.assertEqual(aes.decrypt(encrypted, key), plaintext)
+
+    @unittest.skipUnless(HAS_NUMPY, "numpy is not installed")
+    def test_batch_aes(self):
+        from AESBatch import BatchAES
+        for key_size, key, plaintext, ciphertext in FIPS197_VECTORS:
+            with self.subTest(key_size=key_size):
+                cipher = BatchAES(bytes.fromhex(key))
+                blocks = cipher.to_blocks(bytes.fromhex(plaintext))
+                self.assertEqual(cipher.encrypt_blocks(blocks).tobytes().hex(), ciphertext)
+                blocks = cipher.to_blocks(bytes.fromhex(ciphertext))
+                self.assertEqual(cipher.decrypt_blocks(blocks).tobytes().hex(), plaintext)
+
+
+class RFC6229Test(unittest.TestCase):
+    def test_keystream(self):
+        for key, offset, expected in RFC6229_VECTORS:
+            with self.subTest(key=key, offset=offset):
+                S = RC4.rc4_key_scheduling(bytes.fromhex(key))
+                keystream = RC4.rc4_pseudo_random_generation(S, offset + 16)[offset:]
+                self.assertEqual(bytes(keystream).hex(), expected)
+
+    def test_stream_object(self):
+        for key, offset, expected in RFC6229_VECTORS:
+            with self.subTest(key=key, offset=offset):
+                cipher = RC4.RC4(bytes.fromhex(key))
+                cipher.skip(offset)
+                self.assertEqual(cipher.keystream(16).hex(), expected)
+                self.assertEqual(RC4.rc4_encrypt(bytes(offset + 16), bytes.fromhex(key))[offset:].hex(), expected)
+
+    @unittest.skipUnless(HAS_NUMPY, "numpy is not installed")
+    def test_keystream_batch(self):
+        for key, offset, expected in RFC6229_VECTORS:
+            with self.subTest(key=key, offset=offset):
+                keystreams = RC4.rc4_keystream_batch([bytes.fromhex(key)] * 2, 16, drop=offset)
+                self.assertEqual([bytes(row).hex() for row in keystreams], [expected] * 2)
+
+    def test_encrypt_keys_on_both_sides_of_the_batch_threshold(self):
+        for key, offset, expected in RFC6229_VECTORS:
+            for count in (1, RC4_BATCH_MIN_KEYS):
+                with self.subTest(key=key, offset=offset, keys=count):
+                    ciphertexts = rc4_encrypt_keys(bytes(offset + 16), [bytes.fromhex(key)] * count)
+                    self.assertEqual({ciphertext[offset:].hex() for ciphertext in ciphertexts}, {expected})
+
+
+if __name__ == "__main__":
+    unittest.main()